@@ -0,0 +1,178 @@
+# auth_cache.py
+"""
+Short-lived cache of the user data an authenticated request needs.
+
+`get_current_user` used to SELECT the user by email on every request. Instead,
+the first request with a given token subject loads the user id, plan and this
+period's usage count once and caches them for AUTH_CACHE_TTL seconds.
+
+Entries are dropped whenever the data they hold changes (plan upgrades from the
+Stripe webhook, reserved or released usage), so the TTL only bounds staleness
+from changes made outside this process.
+
+Backends:
+  - "memory" (default): per-process dict; invalidations only reach this process.
+  - "redis": shared by every API and worker process (needs the `redis` package, 4.2+,
+    and AUTH_CACHE_REDIS_URL).
+  - "none": disable caching.
+"""
+
+import os
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import case, select
+
+import models
+from usage import LIFETIME, period_start
+from metrics import CACHE_LOOKUPS
+
+AUTH_CACHE_BACKEND = os.getenv("AUTH_CACHE_BACKEND", "memory").lower()
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "30"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+AUTH_CACHE_REDIS_URL = os.getenv("AUTH_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+class AuthUser:
+    """The cached view of a user. Not attached to a database session."""
+
+    def __init__(self, id, email, plan, usage_count):
+        self.id = id
+        self.email = email
+        self.plan = plan
+        self.usage_count = usage_count
+
+    def to_dict(self):
+        return {"id": self.id, "email": self.email, "plan": self.plan, "usage_count": self.usage_count}
+
+
+# --- Backends ---
+class MemoryBackend:
+    """In-process LRU with per-entry expiry. Thread-safe."""
+
+    def __init__(self, max_entries=AUTH_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    async def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisBackend:
+    """Shared cache for several API/worker processes, on the asyncio client so lookups don't block the event loop."""
+
+    def __init__(self, url=AUTH_CACHE_REDIS_URL):
+        try:
+            import redis.asyncio
+        except ImportError as e:
+            raise RuntimeError("AUTH_CACHE_BACKEND=redis requires the 'redis' package.") from e
+        self._redis = redis.asyncio.Redis.from_url(url)
+
+    async def get(self, key):
+        raw = await self._redis.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key, value, ttl):
+        await self._redis.set(key, json.dumps(value), ex=ttl)
+
+    async def delete(self, key):
+        await self._redis.delete(key)
+
+
+class NullBackend:
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value, ttl):
+        pass
+
+    async def delete(self, key):
+        pass
+
+
+BACKENDS = {"memory": MemoryBackend, "redis": RedisBackend, "none": NullBackend}
+
+
+def _make_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown AUTH_CACHE_BACKEND {name!r}; expected one of {', '.join(BACKENDS)}.")
+    return BACKENDS[name]()
+
+
+# --- Cache ---
+class AuthCache:
+    def __init__(self, backend, ttl=AUTH_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(subject):
+        return f"auth:{subject}"
+
+    async def get_user(self, db, subject):
+        """Return the AuthUser for a token subject (email), or None if no such user exists."""
+        key = self._key(subject)
+        cached = await self.backend.get(key)
+        if cached is not None:
+            CACHE_LOOKUPS.labels("auth", "hit").inc()
+            return AuthUser(**cached)
+
+        CACHE_LOOKUPS.labels("auth", "miss").inc()
+        user = await load_user(db, subject)
+        if user is not None:
+            await self.backend.set(key, user.to_dict(), self.ttl)
+        return user
+
+    async def invalidate(self, subject):
+        """Drop the cached entry for `subject` after its plan or usage changed."""
+        await self.backend.delete(self._key(subject))
+
+
+async def load_user(db, email):
+    """Load an AuthUser, with this period's usage count, in one round-trip (`db` is an AsyncSession)."""
+    usage_count = (
+        select(models.UsageCounter.count)
+        .where(
+            models.UsageCounter.user_id == models.User.id,
+            models.UsageCounter.period_start == case(
+                (models.User.plan == "free", LIFETIME), else_=period_start()
+            ),
+        )
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(models.User.id, models.User.email, models.User.plan, usage_count)
+        .where(models.User.email == email)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    user_id, email, plan, count = row
+    return AuthUser(user_id, email, plan, count or 0)
+
+
+# Shared, process-wide cache instance.
+auth_cache = AuthCache(_make_backend(AUTH_CACHE_BACKEND))
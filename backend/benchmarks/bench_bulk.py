@@ -0,0 +1,107 @@
+# bench_bulk.py
+"""
+Fixing a folder of documents: one `POST /fix-document/bulk` request for all of
+them vs. one `POST /fix-document/` request per document (a few in flight at a
+time, as a client script would send them). Reports wall-clock time, model
+requests and HTTP requests.
+
+The documents are short letters that share a letterhead and a closing, so the
+batch can pack paragraphs of different documents into the same model request
+and fix the shared ones once. Needs no network: the app runs in-process
+against a temporary SQLite database with MODEL_BACKEND=echo. Run from the
+backend directory:
+    python -m benchmarks.bench_bulk --documents 10 50 --paragraphs 8
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import time
+import zipfile
+
+from benchmarks.common import configure, shutdown, sign_up
+
+
+def build_letter(doc, paragraphs):
+    """A letter whose first and last paragraphs are the same in every letter."""
+    from docx import Document
+    document = Document()
+    document.add_paragraph("Acme Corporation , 12 Main Street, springfield.")
+    for i in range(paragraphs):
+        document.add_paragraph(f"Letter {doc}, point {i}: we have  reviewed the account , and i think it is fine.")
+    document.add_paragraph("Thank you for your business , we look forward to working with you again.")
+    buf = io.BytesIO()
+    document.save(buf)
+    return buf.getvalue()
+
+
+async def run(args):
+    import httpx
+    import main
+    import model_backends
+    import process_docx
+
+    backend = model_backends.get_backend("pro")
+    backend.latency = args.latency
+    backend.latency_per_token = args.latency_per_token
+    process_docx.BATCH_TOKEN_BUDGET = args.budget
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        headers = await sign_up(client, "bench@example.com")
+
+        print(f"{'documents':>9} {'mode':>10} {'seconds':>8} {'docs/s':>7} {'model requests':>14} {'http requests':>13}")
+        for count in args.documents:
+            documents = [build_letter(doc, args.paragraphs) for doc in range(count)]
+
+            process_docx.paragraph_cache.clear()
+            backend.requests = 0
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def upload(data):
+                async with semaphore:
+                    resp = await client.post("/fix-document/", headers=headers, files={"file": ("letter.docx", data)})
+                    assert resp.status_code == 200, resp.text
+
+            start = time.perf_counter()
+            await asyncio.gather(*(upload(data) for data in documents))
+            elapsed = time.perf_counter() - start
+            print(f"{count:>9} {'single':>10} {elapsed:>8.2f} {count / elapsed:>7.1f} {backend.requests:>14} {count:>13}")
+
+            process_docx.paragraph_cache.clear()
+            backend.requests = 0
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, "w") as zf:
+                for doc, data in enumerate(documents):
+                    zf.writestr(f"letters/letter{doc}.docx", data)
+            start = time.perf_counter()
+            resp = await client.post("/fix-document/bulk", headers=headers,
+                                     files=[("files", ("letters.zip", archive.getvalue()))])
+            elapsed = time.perf_counter() - start
+            assert resp.status_code == 200 and resp.headers["X-Documents-Fixed"] == str(count), resp.text
+            print(f"{count:>9} {'bulk':>10} {elapsed:>8.2f} {count / elapsed:>7.1f} {backend.requests:>14} {1:>13}")
+
+    await shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, nargs="+", default=[10, 50], help="Documents per batch")
+    parser.add_argument("--paragraphs", type=int, default=8, help="Paragraphs per document besides the shared ones")
+    parser.add_argument("--concurrency", type=int, default=4, help="Single-document uploads in flight at once")
+    parser.add_argument("--budget", type=int, default=800, help="BATCH_TOKEN_BUDGET")
+    parser.add_argument("--latency", type=float, default=0.1, help="Model latency per request (seconds)")
+    parser.add_argument("--latency-per-token", type=float, default=0.0005, help="Extra model latency per output token")
+    args = parser.parse_args()
+
+    # Both modes fix the same documents.
+    configure(document_history=False, BULK_MAX_DOCUMENTS=max(args.documents))
+
+    print(f"{args.paragraphs + 2} paragraphs per document, model latency {args.latency}s + "
+          f"{args.latency_per_token}s/token, {os.cpu_count()} CPUs")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# bench_concurrency.py
+"""
+Wall-clock time of `process_docx.fix_paragraphs` against paragraph count,
+concurrency and batch token budget, using the local fake completion server.
+
+Run from the backend directory:
+    python -m benchmarks.bench_concurrency --latency 0.1
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.fake_openai import start_fake_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.1, help="Simulated model latency per request (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429/500")
+    parser.add_argument("--paragraphs", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--batch-tokens", type=int, nargs="+", default=[0, 800],
+                        help="BATCH_TOKEN_BUDGET values to compare (0 = one paragraph per request)")
+    args = parser.parse_args()
+
+    server = start_fake_server(latency=args.latency, error_rate=args.error_rate)
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ["OPENAI_BACKOFF"] = "0.01"
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    os.environ["PARAGRAPH_CACHE_PERSISTENT"] = "false"
+
+    # Imported late so the client picks up the fake server settings.
+    import process_docx
+
+    print(f"latency={args.latency}s error_rate={args.error_rate}")
+    print(f"{'paragraphs':>10} {'concurrency':>11} {'batch_tok':>9} {'seconds':>9} {'requests':>9}")
+    asyncio.run(_run(process_docx, server, args))
+
+
+async def _run(process_docx, server, args):
+    # Everything runs on one event loop, as it would under uvicorn, so the
+    # client's connection pool is shared between runs.
+    for count in args.paragraphs:
+        texts = [f"Paragraph {i} has a speling mistake." for i in range(count)]
+        for concurrency in args.concurrency:
+            for budget in args.batch_tokens:
+                # Every configuration should pay for its model calls.
+                process_docx.paragraph_cache.clear()
+                server.requests = 0
+                start = time.perf_counter()
+                results = await process_docx.fix_paragraphs(texts, concurrency=concurrency, token_budget=budget)
+                elapsed = time.perf_counter() - start
+                assert results == texts, "results came back out of document order"
+                print(f"{count:>10} {concurrency:>11} {budget:>9} {elapsed:>9.2f} {server.requests:>9}")
+
+
+if __name__ == "__main__":
+    main()
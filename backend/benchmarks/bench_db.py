@@ -0,0 +1,141 @@
+# bench_db.py
+"""
+Requests per second of an authenticated endpoint with the blocking (sync
+session) database path vs. the async session path, at several concurrency
+levels.
+
+"sync" is the old `get_current_user`: a `SessionLocal` query run directly on
+the event loop. "async" is `GET /users/me` as it is now, with the auth cache
+disabled so every request does its database round-trip. Both run in-process
+against the same database.
+
+SQLite has no network round-trip, so by default every statement is delayed by
+--db-latency seconds in the thread that runs it: on the event loop for the sync
+path, in the driver's worker thread for aiosqlite. The async sessions also get a
+connection pool, as they would on PostgreSQL. Point --db-url at a real
+PostgreSQL server for production numbers.
+
+Run from the backend directory:
+    python -m benchmarks.bench_db --requests 2000 --concurrency 1 10 50 --db-latency 0.002
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.common import configure, percentile, shutdown, sign_up
+from benchmarks.fake_openai import start_fake_server
+
+
+def use_pooled_sqlite(latency):
+    """
+    Make SQLite behave more like a server database: give the async sessions a
+    connection pool (SQLAlchemy defaults aiosqlite to NullPool) and delay every
+    statement on both engines, like a network round-trip would.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+    import database
+
+    pooled = create_async_engine(
+        database.ASYNC_DATABASE_URL,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=database.DB_POOL_SIZE,
+        max_overflow=database.DB_MAX_OVERFLOW,
+    )
+    database.async_engine = pooled
+    database.AsyncSessionLocal.configure(bind=pooled)
+    if latency <= 0:
+        return
+
+    def trace(statement):
+        time.sleep(latency)
+
+    @event.listens_for(database.engine, "connect")
+    def on_sync_connect(dbapi_connection, connection_record):
+        dbapi_connection.set_trace_callback(trace)
+
+    @event.listens_for(pooled.sync_engine, "connect")
+    def on_async_connect(dbapi_connection, connection_record):
+        # Registered through aiosqlite, so it runs (and sleeps) in aiosqlite's thread.
+        dbapi_connection.run_async(lambda conn: conn.set_trace_callback(trace))
+
+
+async def run(args):
+    import httpx
+    from fastapi import Depends
+    from fastapi.security import OAuth2PasswordBearer
+    from jose import jwt
+
+    import main
+    import models
+    import schemas
+    from database import SessionLocal
+
+    oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+
+    @main.app.get("/bench/users/me-sync", response_model=schemas.User)
+    async def read_users_me_sync(token: str = Depends(oauth2_scheme)):
+        # The previous blocking path, kept here only for comparison.
+        email = jwt.decode(token, main.SECRET_KEY, algorithms=[main.ALGORITHM])["sub"]
+        db = SessionLocal()
+        try:
+            user = db.query(models.User).filter(models.User.email == email).first()
+            return user
+        finally:
+            db.close()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = await sign_up(client, "bench@example.com", plan="free")
+
+        print(f"{'path':>6} {'concurrency':>11} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for concurrency in args.concurrency:
+            for name, path in (("sync", "/bench/users/me-sync"), ("async", "/users/me")):
+                latencies = []
+                remaining = args.requests
+
+                async def client_loop():
+                    nonlocal remaining
+                    while remaining > 0:
+                        remaining -= 1
+                        start = time.perf_counter()
+                        resp = await client.get(path, headers=headers)
+                        latencies.append(time.perf_counter() - start)
+                        assert resp.status_code == 200, resp.text
+
+                start = time.perf_counter()
+                await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+                elapsed = time.perf_counter() - start
+                ms = [v * 1000 for v in latencies]
+                print(f"{name:>6} {concurrency:>11} {len(ms) / elapsed:>9.0f} "
+                      f"{statistics.median(ms):>8.2f} {percentile(ms, 99):>8.2f}")
+
+    await shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per configuration")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--db-url", help="Database to benchmark against (default: a temporary SQLite file)")
+    parser.add_argument("--db-latency", type=float, default=0.002,
+                        help="Simulated round-trip per statement (seconds) when using SQLite")
+    args = parser.parse_args()
+
+    # No model calls are made; the fake server just keeps startup offline. Every
+    # request should reach the database, so the auth cache is off.
+    database_url = configure(args.db_url, start_fake_server(latency=0).base_url, AUTH_CACHE_BACKEND="none")
+
+    if database_url.startswith("sqlite"):
+        # Before main is imported, so it picks up the pooled engine and every connection gets the delay.
+        use_pooled_sqlite(args.db_latency)
+    print(f"database={database_url} db_latency={args.db_latency}s")
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
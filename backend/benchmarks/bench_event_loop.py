@@ -0,0 +1,81 @@
+# bench_event_loop.py
+"""
+Latency of `GET /users/me` while large documents are being fixed, with the
+document CPU pool on and off (DOC_POOL_SIZE=0 parses and saves on the event loop).
+
+Runs the FastAPI app in-process against SQLite and the local fake completion
+server, uploading articles from the prose corpus (benchmarks/corpus.py). Run
+from the backend directory:
+    python -m benchmarks.bench_event_loop --paragraphs 3000 --uploads 4 --pool-sizes 0 2
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.common import configure, percentile, shutdown, sign_up
+from benchmarks.corpus import build_corpus
+from benchmarks.fake_openai import start_fake_server
+
+
+async def run(args, pool_size):
+    import httpx
+    import main
+    import process_docx
+
+    process_docx.DOC_POOL_SIZE = pool_size
+    process_docx.paragraph_cache.clear()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        headers = await sign_up(client, f"bench{pool_size}@example.com")
+        documents = build_corpus("prose", args.uploads, seed=pool_size, paragraphs=args.paragraphs)
+        latencies = []
+        uploads_done = asyncio.Event()
+
+        async def probe():
+            while not uploads_done.is_set():
+                start = time.perf_counter()
+                await client.get("/users/me", headers=headers)
+                latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(args.probe_interval)
+
+        async def upload(data):
+            resp = await client.post("/fix-document/", headers=headers, files={"file": ("bench.docx", data)})
+            assert resp.status_code == 200, resp.text
+
+        prober = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(upload(data) for data in documents))
+        elapsed = time.perf_counter() - start
+        uploads_done.set()
+        await prober
+
+    await shutdown()
+
+    ms = [v * 1000 for v in latencies]
+    print(f"{pool_size:>9} {elapsed:>9.2f} {len(ms):>7} {statistics.median(ms):>8.1f} "
+          f"{percentile(ms, 95):>8.1f} {percentile(ms, 99):>8.1f} {max(ms):>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=3000, help="Paragraphs per uploaded document")
+    parser.add_argument("--uploads", type=int, default=4, help="Concurrent uploads")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated model latency per request (seconds)")
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    server = start_fake_server(latency=args.latency)
+    configure(openai_base_url=server.base_url, document_history=False, MAX_UPLOAD_MB=200)
+
+    print(f"{args.uploads} uploads x {args.paragraphs} paragraphs, model latency {args.latency}s")
+    print(f"{'pool size':>9} {'total s':>9} {'probes':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for pool_size in args.pool_sizes:
+        asyncio.run(run(args, pool_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# bench_fairness.py
+"""
+How long small free-tier documents wait behind one user's burst of large
+uploads when model capacity is scarce: first come, first served (every request
+in one flow) vs. the fair scheduler (one flow per user, weighted by plan).
+
+Calls `process_docx.fix_paragraphs` directly on the local echo model backend,
+with MODEL_CONCURRENCY slots shared by all documents. Run from the backend
+directory:
+    python -m benchmarks.bench_fairness --big-docs 20 --big-paragraphs 200 --small-docs 5
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+
+async def run(args, fair):
+    import process_docx
+    from scheduler import plan_weight
+
+    process_docx.paragraph_cache.clear()
+
+    async def fix(user, plan, doc, paragraphs, delay):
+        await asyncio.sleep(delay)
+        texts = [f"User {user} document {doc} paragraph {i} has a speling mistake ." for i in range(paragraphs)]
+        start = time.perf_counter()
+        await process_docx.fix_paragraphs(
+            texts, flow=user if fair else "everyone", weight=plan_weight(plan) if fair else 1
+        )
+        return time.perf_counter() - start
+
+    big = [fix("pro-user", "pro", d, args.big_paragraphs, 0) for d in range(args.big_docs)]
+    # Free users arrive once the big burst has filled the queue.
+    small = [fix(f"free-user-{d}", "free", d, args.small_paragraphs, args.small_delay) for d in range(args.small_docs)]
+    results = await asyncio.gather(*big, *small)
+    big_times, small_times = results[:args.big_docs], results[args.big_docs:]
+    print(f"{'fair' if fair else 'fifo':>6} {statistics.median(small_times):>12.2f} {max(small_times):>10.2f} "
+          f"{statistics.median(big_times):>10.2f} {max(big_times):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--big-docs", type=int, default=20, help="Concurrent large documents from one pro user")
+    parser.add_argument("--big-paragraphs", type=int, default=200)
+    parser.add_argument("--small-docs", type=int, default=5, help="Small documents, one per free user")
+    parser.add_argument("--small-paragraphs", type=int, default=10)
+    parser.add_argument("--small-delay", type=float, default=0.5, help="Seconds before the small documents arrive")
+    parser.add_argument("--capacity", type=int, default=16, help="MODEL_CONCURRENCY")
+    parser.add_argument("--latency", type=float, default=0.05, help="Model latency per request (seconds)")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = "sqlite://"
+    os.environ["MODEL_BACKEND"] = "echo"
+    os.environ["ECHO_LATENCY"] = str(args.latency)
+    os.environ["PARAGRAPH_CACHE_PERSISTENT"] = "false"
+    os.environ["MODEL_CONCURRENCY"] = str(args.capacity)
+    # One request per paragraph, so scheduling is fine-grained.
+    os.environ["BATCH_TOKEN_BUDGET"] = "0"
+
+    print(f"{args.big_docs} x {args.big_paragraphs}-paragraph pro documents, {args.small_docs} x "
+          f"{args.small_paragraphs}-paragraph free documents, {args.capacity} model slots, latency {args.latency}s")
+    print(f"{'':>6} {'small p50 s':>12} {'small max':>10} {'big p50 s':>10} {'big max':>10}")
+    for fair in (False, True):
+        asyncio.run(run(args, fair))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# bench_filter.py
+"""
+How many model requests the paragraph pre-filter (paragraph_filter.py) saves on
+a typical resume and business letter, and the time to parse and classify
+each paragraph.
+
+Each document is fixed with the filter off, on, and on with the spelling
+pre-check (if `pyspellchecker` is installed), on the local echo model backend.
+"sent" counts paragraphs that went to the model (before de-duplication and
+batching). Run from the backend directory:
+    python -m benchmarks.bench_filter --copies 20
+"""
+
+import argparse
+import asyncio
+import io
+import time
+
+from benchmarks.common import configure
+
+RESUME = [
+    ("Title", "Jane Q. Doe"),
+    (None, "jane.doe@example.com"),
+    (None, "(555) 123-4567"),
+    (None, "https://www.linkedin.com/in/janedoe"),
+    ("Heading 1", "Summary"),
+    (None, "Product-minded software engineer with eight years of experiance building data pipelines and web services."),
+    ("Heading 1", "Experience"),
+    ("Heading 2", "Senior Engineer, Acme Corp"),
+    (None, "2019 - 2024"),
+    ("List Bullet", "Led the migration of a monolith to services , cutting deploy time from hours to minutes."),
+    ("List Bullet", "Mentored five junior engineers and ran the team's hiring loop."),
+    ("List Bullet", "Python, Go, PostgreSQL"),
+    ("Heading 2", "Engineer, Initech"),
+    (None, "2016 - 2019"),
+    ("List Bullet", "Built the billing system that processes two million invoices a month."),
+    ("List Bullet", "Kubernetes"),
+    ("Heading 1", "Education"),
+    (None, "B.Sc. Computer Science, State University"),
+    (None, "2012 - 2016"),
+    ("Heading 1", "Skills"),
+    ("List Bullet", "Python"),
+    ("List Bullet", "SQL"),
+    ("List Bullet", "Distributed systems"),
+]
+
+LETTER = [
+    (None, "Acme Corporation"),
+    (None, "123 Main Street"),
+    (None, "Springfield, IL 62701"),
+    (None, "March 3, 2024"),
+    (None, "Ms. Mary Smith"),
+    (None, "Hiring Manager"),
+    (None, "Re: Senior Engineer position"),
+    (None, "Dear Ms. Smith,"),
+    (None, "I am writing to apply for the Senior Engineer position advertised on your website."),
+    (None, "In my current role i lead a team of six engineers and have shipped several large projects on time."),
+    (None, "I would welcome the chance to discuss how my experience fits your needs."),
+    (None, "Thank you for your time and consideration."),
+    (None, "Sincerely,"),
+    (None, "Jane Doe"),
+    (None, "Enclosure: Resume"),
+]
+
+
+def build_document(paragraphs, copies):
+    from docx import Document
+    doc = Document()
+    for copy in range(copies):
+        for style, text in paragraphs:
+            doc.add_paragraph(text, style=style)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+async def run(args):
+    import paragraph_filter
+    import process_docx
+
+    settings = [("off", False, False), ("on", True, False)]
+    try:
+        paragraph_filter._spellchecker()
+        settings.append(("on+spelling", True, True))
+    except RuntimeError:
+        print("pyspellchecker is not installed; skipping the spelling pre-check.")
+
+    print(f"{'document':>8} {'filter':>12} {'paragraphs':>10} {'sent':>8} {'saved':>6} {'parse us/para':>14}  skipped by reason")
+    for name, paragraphs in (("resume", RESUME), ("letter", LETTER)):
+        data = build_document(paragraphs, args.copies)
+        for label, enabled, spelling in settings:
+            paragraph_filter.PARAGRAPH_FILTER = enabled
+            paragraph_filter.PARAGRAPH_SPELLCHECK = spelling
+            process_docx.paragraph_cache.clear()
+            _, report = await process_docx.fix_docx_bytes(data)
+
+            start = time.perf_counter()
+            process_docx.extract_paragraphs(data)
+            extract = time.perf_counter() - start
+            sent = report["paragraphs"] - report["skipped"]
+            print(f"{name:>8} {label:>12} {report['paragraphs']:>10} {sent:>8} {1 - sent / report['paragraphs']:>6.0%} "
+                  f"{extract / report['paragraphs'] * 1e6:>14.0f}  {report['skipped_by_reason']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=20, help="Times each sample is repeated in its document")
+    args = parser.parse_args()
+
+    # Parse in-process so the filter settings changed above apply.
+    configure(DOC_POOL_SIZE=0)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
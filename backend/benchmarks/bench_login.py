@@ -0,0 +1,89 @@
+# bench_login.py
+"""
+Login throughput, and `GET /users/me` latency during a burst of logins, with
+bcrypt run inline on the event loop (PASSWORD_HASH_WORKERS=0) vs. in the
+password thread pool.
+
+Runs the FastAPI app in-process against a temporary SQLite database. Run from
+the backend directory:
+    python -m benchmarks.bench_login --logins 64 --concurrency 16 --workers 0 4
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.common import configure, percentile, shutdown, sign_up
+from benchmarks.fake_openai import start_fake_server
+
+
+async def run(args):
+    import httpx
+    import main
+    import passwords
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        credentials = {"username": "bench@example.com", "password": "benchmark"}
+        headers = await sign_up(client, credentials["username"], credentials["password"], plan="free")
+
+        print(f"{'workers':>7} {'logins/s':>9} {'503s':>5} {'me p50 ms':>10} {'me p99 ms':>10} {'me max ms':>10}")
+        for workers in args.workers:
+            passwords.PASSWORD_HASH_WORKERS = workers
+            passwords._executor = None
+            remaining = args.logins
+            ok = busy = 0
+            latencies = []
+            logins_done = asyncio.Event()
+
+            async def login_loop():
+                nonlocal remaining, ok, busy
+                while remaining > 0:
+                    remaining -= 1
+                    resp = await client.post("/login", data=credentials)
+                    if resp.status_code == 503:
+                        busy += 1
+                    else:
+                        assert resp.status_code == 200, resp.text
+                        ok += 1
+
+            async def probe():
+                while not logins_done.is_set():
+                    start = time.perf_counter()
+                    await client.get("/users/me", headers=headers)
+                    latencies.append(time.perf_counter() - start)
+                    await asyncio.sleep(0.01)
+
+            prober = asyncio.create_task(probe())
+            start = time.perf_counter()
+            await asyncio.gather(*(login_loop() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+            logins_done.set()
+            await prober
+
+            ms = [v * 1000 for v in latencies]
+            print(f"{workers:>7} {ok / elapsed:>9.1f} {busy:>5} {statistics.median(ms):>10.1f} "
+                  f"{percentile(ms, 99):>10.1f} {max(ms):>10.1f}")
+
+    await shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64, help="Logins per configuration")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent login clients")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 4],
+                        help="PASSWORD_HASH_WORKERS values to compare (0 = inline)")
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_ROUNDS")
+    args = parser.parse_args()
+
+    configure(openai_base_url=start_fake_server(latency=0).base_url, BCRYPT_ROUNDS=args.rounds)
+
+    print(f"{args.logins} logins, {args.concurrency} concurrent, bcrypt rounds {args.rounds}, {os.cpu_count()} CPUs")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# bench_manuscript.py
+"""
+Fixing a long manuscript with very long paragraphs: wall-clock time, model
+requests, truncated responses and peak Python memory of
+`process_docx.fix_paragraphs`, with and without sentence segmentation
+(SEGMENT_TOKEN_BUDGET) and by window size (FIX_WINDOW_SIZE, 0 = whole document).
+
+Uses the local echo model backend, which cuts responses off at max_tokens like
+a real model. Run from the backend directory:
+    python -m benchmarks.bench_manuscript --pages 500 --windows 0 1000 200
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import tracemalloc
+
+SENTENCES = [
+    "The rain had not stopped since morning , and the streets were empty.",
+    "She folded the letter twice before putting it in her coat pocket.",
+    "Nobody in the village remembered when the old mill had last turned.",
+    "i think we should wait until the others arrive, he said quietly.",
+    "By the time the train reached the coast the sky had cleared.",
+]
+
+
+def build_manuscript(pages, seed=0):
+    """About ten paragraphs a page; every 25th paragraph is a very long one (~1,600 tokens)."""
+    rng = random.Random(seed)
+    texts = []
+    for i in range(pages * 10):
+        count = 100 if i % 25 == 0 else rng.randint(2, 6)
+        # Starts with a sentence the echo backend always changes.
+        sentences = [SENTENCES[0]] + [rng.choice(SENTENCES) for _ in range(count - 1)]
+        texts.append(f"[{i}] " + " ".join(sentences))
+    return texts
+
+
+async def run(args):
+    import model_backends
+    import process_docx
+
+    backend = model_backends.get_backend()
+    backend.latency = args.latency
+    texts = build_manuscript(args.pages)
+    print(f"{args.pages} pages, {len(texts)} paragraphs, {sum(map(len, texts)) / 1e6:.1f} MB of text, "
+          f"model latency {args.latency}s")
+    print(f"{'segments':>8} {'window':>7} {'seconds':>8} {'requests':>8} {'truncated':>9} {'unchanged':>9} {'peak MB':>8}")
+
+    for segment in (False, True):
+        process_docx.SEGMENT_TOKEN_BUDGET = args.segment_tokens if segment else 0
+        for window in args.windows:
+            process_docx.FIX_WINDOW_SIZE = window
+            process_docx.paragraph_cache.clear()
+            backend.requests = backend.truncated = 0
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            results = await process_docx.fix_paragraphs(texts)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            # Every paragraph has something for the echo backend to fix.
+            unchanged = sum(result == text for result, text in zip(results, texts))
+            print(f"{'on' if segment else 'off':>8} {window:>7} {elapsed:>8.2f} {backend.requests:>8} "
+                  f"{backend.truncated:>9} {unchanged:>9} {peak / 1e6:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--windows", type=int, nargs="+", default=[0, 1000, 200], help="FIX_WINDOW_SIZE values")
+    parser.add_argument("--segment-tokens", type=int, default=500, help="SEGMENT_TOKEN_BUDGET when segmenting")
+    parser.add_argument("--latency", type=float, default=0.01, help="Model latency per request (seconds)")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = "sqlite://"
+    os.environ["MODEL_BACKEND"] = "echo"
+    os.environ["PARAGRAPH_CACHE_PERSISTENT"] = "false"
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# bench_pipeline.py
+"""
+Throughput of the whole `POST /fix-document/` path (upload checks, usage
+accounting, parsing, batched model calls with retries, rewriting, saving) on
+the local echo model backend, by batch token budget and injected error rate.
+Uploads are articles from the prose corpus (benchmarks/corpus.py).
+
+Needs no network: the app runs in-process against a temporary SQLite database
+with MODEL_BACKEND=echo. Run from the backend directory:
+    python -m benchmarks.bench_pipeline --uploads 8 --paragraphs 200 --budgets 0 800 --error-rates 0 0.1
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+from benchmarks.common import configure, percentile, shutdown, sign_up
+from benchmarks.corpus import build_corpus
+
+
+async def run(args):
+    import httpx
+    import main
+    import model_backends
+    import process_docx
+
+    backend = model_backends.get_backend("pro")
+    backend.latency = args.latency
+    backend.latency_per_token = args.latency_per_token
+    process_docx.OPENAI_BACKOFF = args.backoff
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        print(f"{'budget':>6} {'errors':>6} {'docs/s':>7} {'paras/s':>8} {'requests':>8} {'failed':>6} "
+              f"{'p50 s':>7} {'p99 s':>7}")
+        run_id = 0
+        for budget in args.budgets:
+            for error_rate in args.error_rates:
+                run_id += 1
+                process_docx.BATCH_TOKEN_BUDGET = budget
+                process_docx.paragraph_cache.clear()
+                backend.error_rate = error_rate
+                backend._random = random.Random(args.seed)
+                backend.requests = backend.failures = 0
+
+                headers = await sign_up(client, f"bench{run_id}@example.com")
+                documents = build_corpus("prose", args.uploads, seed=run_id, paragraphs=args.paragraphs)
+                latencies = []
+                semaphore = asyncio.Semaphore(args.concurrency)
+
+                async def upload(data):
+                    async with semaphore:
+                        start = time.perf_counter()
+                        resp = await client.post("/fix-document/", headers=headers, files={"file": ("bench.docx", data)})
+                        latencies.append(time.perf_counter() - start)
+                        assert resp.status_code == 200, resp.text
+
+                start = time.perf_counter()
+                await asyncio.gather(*(upload(data) for data in documents))
+                elapsed = time.perf_counter() - start
+                print(f"{budget:>6} {error_rate:>6.2f} {args.uploads / elapsed:>7.2f} "
+                      f"{args.uploads * args.paragraphs / elapsed:>8.0f} {backend.requests:>8} {backend.failures:>6} "
+                      f"{statistics.median(latencies):>7.2f} {percentile(latencies, 99):>7.2f}")
+
+    await shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=8, help="Documents per configuration")
+    parser.add_argument("--concurrency", type=int, default=4, help="Uploads in flight at once")
+    parser.add_argument("--paragraphs", type=int, default=200, help="Paragraphs per document")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[0, 800], help="BATCH_TOKEN_BUDGET values")
+    parser.add_argument("--error-rates", type=float, nargs="+", default=[0.0, 0.1],
+                        help="Fraction of model requests that fail (and are retried)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Model latency per request (seconds)")
+    parser.add_argument("--latency-per-token", type=float, default=0.0005, help="Extra model latency per output token")
+    parser.add_argument("--backoff", type=float, default=0.05, help="OPENAI_BACKOFF for retries (seconds)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the injected failures")
+    args = parser.parse_args()
+
+    configure(document_history=False, MAX_UPLOAD_MB=200)
+
+    print(f"{args.uploads} uploads x {args.paragraphs} paragraphs, {args.concurrency} at a time, "
+          f"model latency {args.latency}s + {args.latency_per_token}s/token, {os.cpu_count()} CPUs")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
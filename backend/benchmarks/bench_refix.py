@@ -0,0 +1,87 @@
+# bench_refix.py
+"""
+Re-fixing an edited document: how long the document history lookup
+(`document_history.find_reusable`) takes as a user's history grows, and how
+many paragraphs of the edited version it reuses instead of sending to the model.
+
+Each history document has its own paragraphs plus a few boilerplate paragraphs
+shared by every document (a letterhead, a signature), which is the worst case
+for the (user_id, text_hash) index. The lookup is for an edited copy of one of
+the oldest documents. Run from the backend directory:
+    python -m benchmarks.bench_refix --history 10 100 1000 5000 --paragraphs 200
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def make_document(doc, paragraphs):
+    boilerplate = [f"Acme Corporation letterhead line {i}." for i in range(3)]
+    return boilerplate + [f"Document {doc}, paragraph {i}: the quarterly numbers look fine." for i in range(paragraphs)]
+
+
+def edit(texts, rate, rng):
+    """Change `rate` of the paragraphs and insert a few new ones."""
+    edited = []
+    for text in texts:
+        if rng.random() < rate:
+            edited.append(text + " (revised)")
+        else:
+            edited.append(text)
+        if rng.random() < rate / 4:
+            edited.append(f"A new paragraph {rng.random()}.")
+    return edited
+
+
+def run(args):
+    import database
+    import models
+    import document_history
+
+    models.Base.metadata.create_all(database.engine)
+    rng = random.Random(0)
+    user_id = 1
+    stored = 0
+    print(f"{'history docs':>12} {'rows':>9} {'lookup ms p50':>14} {'p95':>8} {'edit rate':>9} {'reused':>7} {'to model':>8}")
+    for size in args.history:
+        # Grow the user's history to `size` documents.
+        for doc in range(stored, size):
+            texts = make_document(doc, args.paragraphs)
+            hashes = [document_history.paragraph_hash(text) for text in texts]
+            document_history.record(user_id, hashes, texts, [text.upper() for text in texts])
+        stored = size
+
+        for rate in args.edit_rates:
+            texts = edit(make_document(0, args.paragraphs), rate, rng)
+            hashes = [document_history.paragraph_hash(text) for text in texts]
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                reused = document_history.find_reusable(user_id, texts, hashes)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1]
+            print(f"{size:>12} {size * (args.paragraphs + 3):>9} {statistics.median(timings) * 1000:>14.1f} "
+                  f"{p95 * 1000:>8.1f} {rate:>9.0%} {len(reused):>7} {len(texts) - len(reused):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, nargs="+", default=[10, 100, 1000, 5000],
+                        help="Documents in the user's history")
+    parser.add_argument("--paragraphs", type=int, default=200, help="Paragraphs per document")
+    parser.add_argument("--edit-rates", type=float, nargs="+", default=[0.05, 0.3])
+    parser.add_argument("--repeat", type=int, default=20, help="Lookups per measurement")
+    parser.add_argument("--db-url", help="Database to use (default: a temporary SQLite file)")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# bench_rewrite.py
+"""
+Compare writing corrected text back into a document:
+  - legacy:  `para.text = improved` plus forcing Calibri 11pt on every run
+  - rewrite: `docx_rewrite.rewrite_paragraph`, which only touches changed runs
+
+Each paragraph has a plain/bold/plain run structure; a fraction of paragraphs
+get a small correction, the rest come back from the "model" unchanged.
+
+Run from the backend directory:
+    python -m benchmarks.bench_rewrite --paragraphs 1000 10000
+"""
+
+import argparse
+import io
+import random
+import time
+
+from docx import Document
+from docx.shared import Pt
+
+from docx_rewrite import paragraph_text, rewrite_paragraph
+
+WORDS = "the quick brown fox jumps over lazy dog while report shows quarterly revenue growth".split()
+
+
+def build_document(count, seed=0):
+    rng = random.Random(seed)
+    doc = Document()
+    for _ in range(count):
+        para = doc.add_paragraph()
+        para.add_run(" ".join(rng.choice(WORDS) for _ in range(12)) + " ")
+        para.add_run(" ".join(rng.choice(WORDS) for _ in range(3))).bold = True
+        para.add_run(" " + " ".join(rng.choice(WORDS) for _ in range(15)) + " teh end.")
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def corrections(texts, changed_fraction, seed=1):
+    rng = random.Random(seed)
+    return [text.replace("teh", "the") if rng.random() < changed_fraction else text for text in texts]
+
+
+def apply_legacy(doc, improved_texts):
+    for para, improved in zip(doc.paragraphs, improved_texts):
+        para.text = improved
+        for run in para.runs:
+            run.font.name = "Calibri"
+            run.font.size = Pt(11)
+
+
+def apply_rewrite(doc, improved_texts):
+    for para, improved in zip(doc.paragraphs, improved_texts):
+        rewrite_paragraph(para._p, improved)
+
+
+def run(data, improved_texts, apply):
+    doc = Document(io.BytesIO(data))
+    start = time.perf_counter()
+    apply(doc, improved_texts)
+    applied = time.perf_counter()
+    out = io.BytesIO()
+    doc.save(out)
+    saved = time.perf_counter()
+    bold_runs = sum(1 for para in doc.paragraphs for r in para.runs if r.bold)
+    return applied - start, saved - applied, bold_runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--changed", type=float, default=0.2, help="Fraction of paragraphs the model changes")
+    args = parser.parse_args()
+
+    print(f"changed fraction={args.changed}")
+    print(f"{'paragraphs':>10} {'method':>8} {'apply s':>9} {'save s':>8} {'bold runs kept':>15}")
+    for count in args.paragraphs:
+        data = build_document(count)
+        texts = [paragraph_text(p._p).strip() for p in Document(io.BytesIO(data)).paragraphs]
+        improved_texts = corrections(texts, args.changed)
+        for name, apply in (("legacy", apply_legacy), ("rewrite", apply_rewrite)):
+            apply_s, save_s, bold = run(data, improved_texts, apply)
+            print(f"{count:>10} {name:>8} {apply_s:>9.3f} {save_s:>8.3f} {bold:>10}/{count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# bench_startup.py
+"""
+Cold-start time of an API worker: how long `import main` takes in a fresh
+interpreter, and how long after launching uvicorn the first `GET /` and the
+first successful `GET /ready` are answered.
+
+Uses a temporary SQLite database and the local fake completion server. Run from
+the backend directory:
+    python -m benchmarks.bench_startup --runs 5
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks.fake_openai import start_fake_server
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, deadline):
+    """Poll `url` until it answers 200; return the time it did."""
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as resp:
+                if resp.status == 200:
+                    return time.perf_counter()
+        except OSError:
+            # Not listening yet, timed out, or not ready (503).
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(f"{url} did not become ready")
+
+
+def measure_import(env):
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def measure_serve(env, timeout):
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        first = wait_for(f"http://127.0.0.1:{port}/", start + timeout)
+        ready = wait_for(f"http://127.0.0.1:{port}/ready", start + timeout)
+        return first - start, ready - start
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def summary(values):
+    return f"median {statistics.median(values) * 1000:7.0f} ms   max {max(values) * 1000:7.0f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Give up on a run after this many seconds")
+    args = parser.parse_args()
+
+    server = start_fake_server(latency=0)
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}",
+        "OPENAI_BASE_URL": server.base_url,
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY", "sk-fake"),
+    })
+
+    imports, first_responses, readies = [], [], []
+    for _ in range(args.runs):
+        imports.append(measure_import(env))
+        first, ready = measure_serve(env, args.timeout)
+        first_responses.append(first)
+        readies.append(ready)
+
+    print(f"{args.runs} runs, {os.cpu_count()} CPUs")
+    print(f"import main            {summary(imports)}")
+    print(f"launch -> GET /        {summary(first_responses)}")
+    print(f"launch -> GET /ready   {summary(readies)}")
+
+
+if __name__ == "__main__":
+    main()
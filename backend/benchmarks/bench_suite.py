@@ -0,0 +1,292 @@
+# bench_suite.py
+"""
+End-to-end benchmark of the API, to compare commits. Runs the FastAPI app
+in-process against a temporary SQLite database and the echo model backend
+(with configurable latency), so it needs no network or API key.
+
+Scenarios:
+  users_me      GET /users/me with a valid token
+  login         POST /login (bcrypt at BCRYPT_ROUNDS)
+  fix_<kind>    POST /fix-document/ with a synthetic corpus (see benchmarks/corpus.py:
+                prose, tables, resume, manuscript)
+
+Each reports requests per second, p50/p95/p99 latency, errors and the peak
+resident memory of the process and its document pool during the scenario;
+fixes also report documents per second and model calls per document. Results
+(with the commit, machine and settings) are saved as JSON with --output, and
+--compare prints the change against an earlier file and exits with status 1
+if anything got worse by more than --threshold. Run from the backend directory:
+    python -m benchmarks.bench_suite --output before.json
+    python -m benchmarks.bench_suite --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from benchmarks.common import configure, percentile, shutdown, sign_up
+from benchmarks.corpus import KINDS, build_corpus
+
+# Metrics compared by --compare: True if higher is better.
+COMPARED = {
+    "requests_per_s": True,
+    "documents_per_s": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "peak_rss_mb": False,
+    "model_calls_per_doc": False,
+}
+
+
+def _rss_of(pid):
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def tree_rss():
+    """Resident bytes of this process and its children (the document pool), from /proc."""
+    me = str(os.getpid())
+    total = _rss_of(me)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                parent = f.read().rsplit(")", 1)[1].split()[1]
+            if parent == me:
+                total += _rss_of(entry)
+        except OSError:
+            # Exited while we looked.
+            continue
+    return total
+
+
+class PeakRSS:
+    """
+    Samples tree_rss() in a thread while a scenario runs. Without /proc (not
+    Linux) it falls back to this process's own lifetime peak (ru_maxrss).
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if os.path.isdir("/proc"):
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, tree_rss())
+            self._stop.wait(self.interval)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        else:
+            try:
+                import resource
+                # KB on Linux, bytes on macOS.
+                scale = 1 if sys.platform == "darwin" else 1024
+                self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+            except ImportError:
+                self.peak = 0
+
+
+async def drive(send, count, concurrency):
+    """Call `send()` `count` times, `concurrency` at a time. Returns (latencies, status codes, seconds)."""
+    remaining = count
+    latencies, statuses = [], []
+
+    async def client_loop():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            resp = await send()
+            latencies.append(time.perf_counter() - start)
+            statuses.append(resp.status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+def summarize(latencies, statuses, elapsed, rss):
+    return {
+        "requests": len(latencies),
+        "errors": sum(1 for code in statuses if code != 200),
+        "seconds": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "peak_rss_mb": round(rss.peak / 2**20, 1),
+    }
+
+
+async def run(args):
+    import httpx
+    import main
+    import model_backends
+    import passwords
+    import process_docx
+
+    backend = model_backends.get_backend("pro")
+    backend.latency = args.latency
+    backend.latency_per_token = args.latency_per_token
+    backend.error_rate = args.error_rate
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": vars(args),
+            "config": {
+                "BCRYPT_ROUNDS": passwords.BCRYPT_ROUNDS,
+                "PASSWORD_HASH_WORKERS": passwords.PASSWORD_HASH_WORKERS,
+                "DOC_POOL_SIZE": process_docx.DOC_POOL_SIZE,
+                "FIX_CONCURRENCY": process_docx.FIX_CONCURRENCY,
+                "BATCH_TOKEN_BUDGET": process_docx.BATCH_TOKEN_BUDGET,
+            },
+        },
+        "scenarios": {},
+    }
+    scenarios = results["scenarios"]
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        email, password = "bench@example.com", "benchmark"
+        headers = await sign_up(client, email, password)
+
+        print(f"{'scenario':<16} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'peak MB':>8} {'docs/s':>7} {'calls/doc':>9}")
+
+        def show(name, result):
+            print(f"{name:<16} {result['requests']:>8} {result['errors']:>6} {result['requests_per_s']:>8.2f} "
+                  f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+                  f"{result['peak_rss_mb']:>8.1f} {result.get('documents_per_s', ''):>7} "
+                  f"{result.get('model_calls_per_doc', ''):>9}")
+
+        with PeakRSS() as rss:
+            timings = await drive(lambda: client.get("/users/me", headers=headers), args.probes, args.concurrency)
+        scenarios["users_me"] = summarize(*timings, rss)
+        show("users_me", scenarios["users_me"])
+
+        credentials = {"username": email, "password": password}
+        with PeakRSS() as rss:
+            timings = await drive(lambda: client.post("/login", data=credentials), args.logins, args.concurrency)
+        scenarios["login"] = summarize(*timings, rss)
+        show("login", scenarios["login"])
+
+        for kind in args.corpora:
+            count = args.manuscript_uploads if kind == "manuscript" else args.uploads
+            documents = iter(build_corpus(kind, count, args.seed))
+            sizes = []
+
+            def upload():
+                data = next(documents)
+                sizes.append(len(data))
+                return client.post("/fix-document/", headers=headers, files={"file": (f"{kind}.docx", data)})
+
+            process_docx.paragraph_cache.clear()
+            backend.requests = backend.failures = 0
+            with PeakRSS() as rss:
+                timings = await drive(upload, count, min(args.concurrency, count))
+            result = summarize(*timings, rss)
+            fixed = result["requests"] - result["errors"]
+            result["documents_per_s"] = round(fixed / timings[2], 2)
+            result["model_calls_per_doc"] = round(backend.requests / count, 1)
+            result["model_failures"] = backend.failures
+            result["document_kb"] = round(sum(sizes) / len(sizes) / 1024, 1)
+            scenarios[f"fix_{kind}"] = result
+            show(f"fix_{kind}", result)
+
+    await shutdown()
+    return results
+
+
+def git_commit():
+    """Short commit of the working tree (with -dirty if it has changes), or None outside git."""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print each compared metric against `baseline`; returns True if any got worse by more than `threshold`."""
+    print(f"\nvs. {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):")
+    print(f"{'scenario':<16} {'metric':<20} {'before':>10} {'after':>10} {'change':>8}")
+    regressed = False
+    for name, result in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if not before:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            if metric not in result or not before.get(metric):
+                continue
+            change = result[metric] / before[metric] - 1
+            worse = -change if higher_is_better else change
+            flag = " worse" if worse > threshold else ""
+            regressed = regressed or bool(flag)
+            print(f"{name:<16} {metric:<20} {before[metric]:>10} {result[metric]:>10} {change:>+8.0%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpora", nargs="+", choices=sorted(KINDS), default=list(KINDS),
+                        help="Corpora to upload")
+    parser.add_argument("--uploads", type=int, default=8, help="Documents per corpus")
+    parser.add_argument("--manuscript-uploads", type=int, default=2, help="Documents of the manuscript corpus")
+    parser.add_argument("--probes", type=int, default=500, help="GET /users/me requests")
+    parser.add_argument("--logins", type=int, default=16, help="POST /login requests")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("--latency", type=float, default=0.05, help="Model latency per request (seconds)")
+    parser.add_argument("--latency-per-token", type=float, default=0.0005, help="Extra model latency per output token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of model requests that fail")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative change that counts as a regression with --compare")
+    args = parser.parse_args()
+
+    configure(ECHO_SEED=args.seed)
+
+    print(f"model latency {args.latency}s + {args.latency_per_token}s/token, error rate {args.error_rate}, "
+          f"{args.concurrency} requests at a time, {os.cpu_count()} CPUs")
+    results = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
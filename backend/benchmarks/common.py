@@ -0,0 +1,73 @@
+# common.py
+"""
+Helpers shared by the benchmarks that run the FastAPI app in-process: the
+environment they run it in, a signed-up user to send requests as, cleanup,
+and latency percentiles. Documents to upload come from benchmarks/corpus.py.
+"""
+
+import os
+import tempfile
+
+
+def configure(database_url=None, openai_base_url=None, document_history=True, **settings):
+    """
+    Set up the environment for the app. Call it before `main` (or any module
+    it imports) is imported, since they read their settings at import time.
+
+    The database is a temporary SQLite file unless `database_url` is given.
+    Models are the local echo backend, or the completion server at
+    `openai_base_url` (see benchmarks/fake_openai.py). The paragraph cache stays
+    in memory and stage logs are off. Rate limits are off too: every request
+    comes from one client; measure the server, not the rate limiter. Pass
+    `document_history=False` when the same documents are uploaded more than
+    once, to measure fixing them rather than reusing the last run. Other
+    `settings` are set as environment variables. Returns the database URL.
+    """
+    database_url = database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ["DATABASE_URL"] = database_url
+    for name in ("MODEL_BACKEND", "MODEL_BACKEND_FREE", "MODEL_BACKEND_PRO"):
+        os.environ.pop(name, None)
+    if openai_base_url:
+        os.environ["OPENAI_BASE_URL"] = openai_base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    else:
+        os.environ["MODEL_BACKEND"] = "echo"
+    os.environ["PARAGRAPH_CACHE_PERSISTENT"] = "false"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ["STAGE_LOGS"] = "false"
+    if not document_history:
+        os.environ["DOCUMENT_HISTORY"] = "false"
+    for name, value in settings.items():
+        os.environ[name] = str(value)
+    return database_url
+
+
+async def sign_up(client, email, password="benchmark", plan="pro"):
+    """Sign up `email` through `client` and put it on `plan`; returns its Authorization header."""
+    import database
+    import main
+    import models
+
+    resp = await client.post("/signup", json={"email": email, "password": password})
+    assert resp.status_code == 200, resp.text
+    if plan != "free":
+        db = database.SessionLocal()
+        db.query(models.User).filter(models.User.email == email).update({models.User.plan: plan})
+        db.commit()
+        db.close()
+        await main.auth_cache.invalidate(email)
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+async def shutdown():
+    """Run the app's shutdown handlers, which ASGITransport doesn't, and stop the document pool."""
+    import main
+    import process_docx
+
+    await main.app.router.shutdown()
+    process_docx.shutdown_doc_pool()
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
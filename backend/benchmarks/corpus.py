@@ -0,0 +1,152 @@
+# corpus.py
+"""
+Synthetic .docx corpora for the benchmarks. Every document is built from a seed,
+so the same arguments always give documents with the same content, and no
+two seeds share paragraphs (so caches and document history don't blur runs).
+
+Kinds:
+  prose       articles: headings and paragraphs of a few sentences
+  tables      reports: short paragraphs around tables of sentence-length cells
+  resume      resumes: name, contact line, dated sections and bullet lists
+  manuscript  book-length: 1,200 paragraphs, a few of them very long
+
+Write a corpus to disk to look at or to upload by hand:
+    python -m benchmarks.corpus --kind resume --count 5 --out /tmp/corpus
+"""
+
+import argparse
+import io
+import os
+import random
+
+SUBJECTS = ["The team", "Our client", "The report", "This proposal", "The committee", "Each customer", "The project"]
+VERBS = ["reviewed", "described", "improved", "questioned", "summarised", "delivered", "changed"]
+OBJECTS = ["the quarterly numbers", "the new process", "the shipping schedule", "its main findings",
+           "the budget for next year", "the support backlog", "the onboarding guide"]
+TAILS = ["before the deadline", "in some detail", "with a few open questions", "after the last meeting",
+         "for the regional offices", "without any major changes", "as agreed in march"]
+# Typical slips the model is asked to fix: doubled spaces, a space before a comma,
+# a lowercase "i", a common misspelling.
+MISTAKES = [
+    lambda s: s.replace(" ", "  ", 1),
+    lambda s: s.replace(",", " ,", 1) if "," in s else s[:-1] + " , i think.",
+    lambda s: s[:-1] + " and i agree.",
+    lambda s: s.replace("the ", "teh ", 1),
+]
+
+
+def sentence(rng, n):
+    """A sentence made unique by `n`, with a mistake in about half of them."""
+    text = (f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)} {rng.choice(TAILS)}, "
+            f"as noted in item {n}.")
+    return rng.choice(MISTAKES)(text) if rng.random() < 0.5 else text
+
+
+def paragraph(rng, n, sentences):
+    return " ".join(sentence(rng, f"{n}.{i}") for i in range(sentences))
+
+
+def build_prose(seed, paragraphs=60):
+    from docx import Document
+    rng = random.Random(seed)
+    doc = Document()
+    doc.add_heading(f"Article {seed}", level=0)
+    for i in range(paragraphs):
+        if i % 10 == 0:
+            doc.add_heading(f"Section {i // 10 + 1}", level=1)
+        doc.add_paragraph(paragraph(rng, f"{seed}.{i}", rng.randint(2, 5)))
+    return doc
+
+
+def build_tables(seed, tables=8, rows=6, cols=4):
+    from docx import Document
+    rng = random.Random(seed)
+    doc = Document()
+    doc.add_heading(f"Report {seed}", level=0)
+    for t in range(tables):
+        doc.add_paragraph(paragraph(rng, f"{seed}.{t}", 2))
+        table = doc.add_table(rows=rows, cols=cols)
+        for r, row in enumerate(table.rows):
+            for c, cell in enumerate(row.cells):
+                # A header row, a number column, and sentence cells.
+                if r == 0:
+                    cell.text = f"Column {c + 1}"
+                elif c == 0:
+                    cell.text = f"{rng.randint(1, 99999):,}"
+                else:
+                    cell.text = sentence(rng, f"{seed}.{t}.{r}.{c}")
+    return doc
+
+
+def build_resume(seed, jobs=5, bullets=4):
+    from docx import Document
+    rng = random.Random(seed)
+    doc = Document()
+    doc.add_heading(f"Candidate {seed}", level=0)
+    doc.add_paragraph(f"candidate{seed}@example.com")
+    doc.add_paragraph(f"+1 555 {seed % 1000:03d} {rng.randint(1000, 9999)}")
+    doc.add_heading("Summary", level=1)
+    doc.add_paragraph(paragraph(rng, f"{seed}.summary", 3))
+    doc.add_heading("Experience", level=1)
+    for j in range(jobs):
+        doc.add_heading(f"Role {j + 1}, Company {seed}-{j}", level=2)
+        doc.add_paragraph(f"{2010 + j} - {2011 + j}")
+        for b in range(bullets):
+            doc.add_paragraph(sentence(rng, f"{seed}.{j}.{b}"), style="List Bullet")
+    doc.add_heading("Skills", level=1)
+    doc.add_paragraph("Python, SQL, Excel")
+    return doc
+
+
+def build_manuscript(seed, paragraphs=1200, long_every=100):
+    from docx import Document
+    rng = random.Random(seed)
+    doc = Document()
+    doc.add_heading(f"Manuscript {seed}", level=0)
+    for i in range(paragraphs):
+        if i % 50 == 0:
+            doc.add_heading(f"Chapter {i // 50 + 1}", level=1)
+        sentences = 40 if i % long_every == long_every - 1 else rng.randint(1, 4)
+        doc.add_paragraph(paragraph(rng, f"{seed}.{i}", sentences))
+    return doc
+
+
+KINDS = {
+    "prose": build_prose,
+    "tables": build_tables,
+    "resume": build_resume,
+    "manuscript": build_manuscript,
+}
+
+
+def build_document(kind, seed, **size):
+    """One document of `kind` as .docx bytes; `size` overrides the builder's defaults (e.g. `paragraphs=`)."""
+    buf = io.BytesIO()
+    KINDS[kind](seed, **size).save(buf)
+    return buf.getvalue()
+
+
+def build_corpus(kind, count, seed=0, **size):
+    """`count` distinct documents of `kind` as .docx bytes."""
+    return [build_document(kind, seed * 100000 + i, **size) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kind", choices=sorted(KINDS), nargs="+", default=sorted(KINDS))
+    parser.add_argument("--count", type=int, default=3, help="Documents per kind")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="Directory to write the .docx files to")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for kind in args.kind:
+        for i, data in enumerate(build_corpus(kind, args.count, args.seed)):
+            path = os.path.join(args.out, f"{kind}_{i}.docx")
+            with open(path, "wb") as f:
+                f.write(data)
+            print(f"{path} ({len(data) // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
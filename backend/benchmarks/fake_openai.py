@@ -0,0 +1,75 @@
+# fake_openai.py
+"""
+A tiny local stand-in for the OpenAI HTTP API, used by the benchmarks.
+
+It answers `POST /v1/chat/completions` after a configurable delay by echoing
+the text that follows the first blank line of the last user message, and
+answers `GET /v1/models` so client start-up checks succeed. A fraction of
+requests can be made to fail with 429/500 to exercise retry handling.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "created": 0, "owned_by": "fake"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        time.sleep(server.latency)
+
+        if random.random() < server.error_rate:
+            status = random.choice((429, 500))
+            self._send_json(status, {"error": {"message": "injected failure", "type": "fake", "code": status}})
+            return
+
+        user_messages = [m["content"] for m in body.get("messages", []) if m.get("role") == "user"]
+        prompt = user_messages[-1] if user_messages else ""
+        _, _, text = prompt.partition("\n\n")
+        self._send_json(200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text or prompt}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4, "total_tokens": (len(prompt) + len(text)) // 4},
+        })
+
+
+def start_fake_server(latency=0.05, error_rate=0.0):
+    """Start the fake server on a free local port in a daemon thread and return it."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    return server
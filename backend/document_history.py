@@ -0,0 +1,139 @@
+# document_history.py
+"""
+Per-user history of fixed documents, so an edited re-upload only sends its new
+or changed paragraphs to the model.
+
+For every fixed document we store each paragraph's content hash and the
+correction it got (`document_paragraphs` table). On the next upload:
+  1. A sample of up to DOCUMENT_HISTORY_SAMPLE of its paragraph hashes is looked
+     up in the (user_id, text_hash) index; the earlier document with the most
+     of them (the newest on a tie) is the previous version. Only matching rows
+     are read, so this stays fast however many documents the user has.
+  2. The two hash sequences are diffed (difflib), and paragraphs in unchanged
+     runs get their previous correction back.
+  3. If fewer than DOCUMENT_HISTORY_MIN_MATCH of the paragraphs matched, the
+     upload is treated as a new document and nothing is reused.
+
+Unlike the paragraph cache, which is shared by everyone and keyed per model
+setting, this reuses a user's own earlier corrections as they were. Rows older
+than DOCUMENT_HISTORY_DAYS are purged. Like the cache, the history is
+best-effort: database errors are logged and the document is fixed as usual.
+"""
+
+import os
+import time
+import uuid
+import hashlib
+from datetime import datetime, timedelta, timezone
+from difflib import SequenceMatcher
+
+from sqlalchemy import desc, distinct, func
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import SessionLocal
+from paragraph_cache import normalize_text
+import models
+
+DOCUMENT_HISTORY = os.getenv("DOCUMENT_HISTORY", "true").lower() == "true"
+DOCUMENT_HISTORY_MIN_MATCH = float(os.getenv("DOCUMENT_HISTORY_MIN_MATCH", "0.5"))
+DOCUMENT_HISTORY_SAMPLE = int(os.getenv("DOCUMENT_HISTORY_SAMPLE", "32"))
+DOCUMENT_HISTORY_DAYS = int(os.getenv("DOCUMENT_HISTORY_DAYS", "90"))
+# Expired rows are purged at most this often (seconds).
+DOCUMENT_HISTORY_PURGE_INTERVAL = int(os.getenv("DOCUMENT_HISTORY_PURGE_INTERVAL", "3600"))
+
+_last_purge = 0.0
+
+
+def paragraph_hash(text):
+    """Content hash of a paragraph; re-spacing it doesn't change the hash."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()[:32]
+
+
+def _sample(hashes, size):
+    """Up to `size` distinct hashes spread evenly over the document."""
+    distinct_hashes = list(dict.fromkeys(hashes))
+    if len(distinct_hashes) <= size:
+        return distinct_hashes
+    step = len(distinct_hashes) / size
+    return [distinct_hashes[int(i * step)] for i in range(size)]
+
+
+def _previous_version(db, user_id, hashes):
+    """[(text_hash, fixed_text)] of the user's earlier document most like `hashes`, or None."""
+    P = models.DocumentParagraph
+    best = (
+        db.query(P.document_id)
+        .filter(P.user_id == user_id, P.text_hash.in_(_sample(hashes, DOCUMENT_HISTORY_SAMPLE)))
+        .group_by(P.document_id)
+        .order_by(desc(func.count(distinct(P.text_hash))), desc(func.max(P.id)))
+        .first()
+    )
+    if best is None:
+        return None
+    return (
+        db.query(P.text_hash, P.fixed_text)
+        .filter(P.document_id == best.document_id)
+        .order_by(P.position)
+        .all()
+    )
+
+
+def find_reusable(user_id, texts, hashes):
+    """
+    {index into texts: corrected text} for the paragraphs of a new upload that are
+    unchanged since the user's previous version of the document (empty if there is none).
+    """
+    if not hashes:
+        return {}
+    db = SessionLocal()
+    try:
+        previous = _previous_version(db, user_id, hashes)
+    except SQLAlchemyError as e:
+        print(f"Document history lookup skipped: {e}")
+        return {}
+    finally:
+        db.close()
+    if not previous:
+        return {}
+
+    matcher = SequenceMatcher(None, [h for h, _ in previous], hashes, autojunk=False)
+    reused = {}
+    for a, b, size in matcher.get_matching_blocks():
+        for k in range(size):
+            fixed = previous[a + k][1]
+            reused[b + k] = texts[b + k] if fixed is None else fixed
+    if len(reused) < DOCUMENT_HISTORY_MIN_MATCH * len(hashes):
+        return {}
+    return reused
+
+
+def record(user_id, hashes, texts, fixed_texts):
+    """Store a fixed document's paragraph hashes and corrections under a new document id."""
+    global _last_purge
+    if not hashes:
+        return
+    document_id = str(uuid.uuid4())
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(models.DocumentParagraph, [
+            {
+                "user_id": user_id,
+                "document_id": document_id,
+                "position": position,
+                "text_hash": text_hash,
+                "fixed_text": None if fixed == text else fixed,
+            }
+            for position, (text_hash, text, fixed) in enumerate(zip(hashes, texts, fixed_texts))
+        ])
+        if time.time() - _last_purge > DOCUMENT_HISTORY_PURGE_INTERVAL:
+            _last_purge = time.time()
+            cutoff = datetime.now(timezone.utc) - timedelta(days=DOCUMENT_HISTORY_DAYS)
+            db.query(models.DocumentParagraph).filter(
+                models.DocumentParagraph.created_at < cutoff
+            ).delete(synchronize_session=False)
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"Document history write skipped: {e}")
+    finally:
+        db.close()
@@ -0,0 +1,79 @@
+# docx_pipeline.py
+"""
+The CPU-bound halves of fixing a document: parsing it into paragraph texts, and
+applying corrected texts and saving it again.
+
+These are plain synchronous functions over bytes so they can run in a worker
+process (see `process_docx.run_cpu`); this module deliberately imports nothing
+that talks to the network or the database.
+"""
+
+import io
+import time
+
+from docx import Document
+from docx.shared import Pt, Inches
+
+from docx_rewrite import paragraph_text, rewrite_paragraph
+from docx_traversal import load_stories, iter_paragraphs, save_stories
+from paragraph_filter import skip_reason
+
+
+def _load(contents):
+    doc = Document(io.BytesIO(contents))
+    stories = load_stories(doc)
+    return doc, stories, list(iter_paragraphs(stories))
+
+
+def extract_paragraphs(contents):
+    """
+    Parse a .docx and return (total paragraph count, [(index, text)], skipped) for every
+    non-empty paragraph: body, tables, text boxes, headers, footers and notes.
+    Paragraphs that need no model call (see `paragraph_filter`) are left out of the
+    list and counted in `skipped`, a {reason: count} dict.
+    """
+    _, _, paragraphs = _load(contents)
+    targets = []
+    skipped = {}
+    for i, p in enumerate(paragraphs):
+        text = paragraph_text(p).strip()
+        if not text:
+            continue
+        reason = skip_reason(text, p.style)
+        if reason:
+            skipped[reason] = skipped.get(reason, 0) + 1
+        else:
+            targets.append((i, text))
+    return len(paragraphs), targets, skipped
+
+
+def apply_corrections(contents, corrections):
+    """
+    Re-parse a .docx, apply {paragraph index: corrected text} (indices as returned by
+    `extract_paragraphs`), apply house formatting, and return (fixed bytes, paragraphs changed,
+    timings), where timings has the seconds spent rewriting and saving (for metrics).
+    """
+    start = time.perf_counter()
+    doc, stories, paragraphs = _load(contents)
+
+    # Touch only the runs that changed
+    changed = sum(rewrite_paragraph(paragraphs[i], text) for i, text in corrections.items())
+    save_stories(stories)
+
+    # Use a consistent default font; explicit run formatting is kept
+    normal = doc.styles["Normal"].font
+    normal.name = "Calibri"
+    normal.size = Pt(11)
+
+    # Set global document formatting
+    for section in doc.sections:
+        section.top_margin = Inches(1)
+        section.bottom_margin = Inches(1)
+        section.left_margin = Inches(1)
+        section.right_margin = Inches(1)
+
+    saving = time.perf_counter()
+    out = io.BytesIO()
+    doc.save(out)
+    timings = {"rewrite": saving - start, "save": time.perf_counter() - saving}
+    return out.getvalue(), changed, timings
@@ -0,0 +1,190 @@
+# docx_rewrite.py
+"""
+Apply corrected text to a paragraph without destroying its runs.
+
+Assigning `paragraph.text` replaces every run with a single new one, dropping
+bold/italic, character styles and hyperlinks. Instead we diff the corrected text
+against the original word by word and rewrite only the `w:t` elements whose text
+actually changes; everything else in the paragraph XML is left untouched.
+"""
+
+import re
+from difflib import SequenceMatcher
+
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+_T = qn("w:t")
+_R = qn("w:r")
+_HYPERLINK = qn("w:hyperlink")
+_TEXT_TAGS = {qn(tag) for tag in ("w:br", "w:cr", "w:noBreakHyphen", "w:ptab", "w:t", "w:tab")}
+_XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+# Words, whitespace runs and single punctuation marks.
+_TOKEN_RE = re.compile(r"\w+|\s+|[^\w\s]")
+_CONTROL_RE = re.compile(r"([\t\n\r])")
+
+
+def _segments(p):
+    """
+    Break a `w:p` element into (element, text) pieces in reading order. Only `w:t`
+    pieces are editable; tabs, breaks etc. are kept as fixed characters.
+    Mirrors how python-docx builds `Paragraph.text`.
+    """
+    # Plain element iteration; per-run XPath calls dominate on large documents.
+    segments = []
+    for child in p:
+        if child.tag == _R:
+            runs = (child,)
+        elif child.tag == _HYPERLINK:
+            runs = [r for r in child if r.tag == _R]
+        else:
+            continue
+        for r in runs:
+            for el in r:
+                if el.tag in _TEXT_TAGS:
+                    text = str(el)
+                    if text:
+                        segments.append((el, text))
+    return segments
+
+
+def paragraph_text(p):
+    """The text of a `w:p` element, as `rewrite_paragraph` sees it."""
+    return "".join(text for _, text in _segments(p))
+
+
+def _char_offsets(tokens):
+    offsets = [0]
+    for token in tokens:
+        offsets.append(offsets[-1] + len(token))
+    return offsets
+
+
+def _set_text(t, text):
+    t.text = text
+    if text != text.strip():
+        t.set(_XML_SPACE, "preserve")
+
+
+def _opcodes(old, new):
+    """
+    SequenceMatcher opcodes, diffing only the span between the common prefix and
+    suffix. Corrections are usually local, and this keeps the quadratic part small.
+    """
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+
+    opcodes = []
+    if prefix:
+        opcodes.append(("equal", 0, prefix, 0, prefix))
+    matcher = SequenceMatcher(None, old[prefix:len(old) - suffix], new[prefix:len(new) - suffix], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        opcodes.append((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix))
+    if suffix:
+        opcodes.append(("equal", len(old) - suffix, len(old), len(new) - suffix, len(new)))
+    return opcodes
+
+
+def rewrite_paragraph(p, new_text):
+    """
+    Rewrite `w:p` element `p` so its text reads `new_text`. `new_text` replaces the
+    stripped original; surrounding whitespace is kept. Runs whose text doesn't change
+    are not touched, so their formatting survives.
+
+    Returns True if the paragraph changed, False if it already read `new_text`.
+    When an edit adds or removes a tab or line break, all the text is moved into the
+    first run instead, which keeps that run's formatting only.
+    """
+    segments = _segments(p)
+    original = "".join(text for _, text in segments)
+    lead = len(original) - len(original.lstrip())
+    trail = len(original.rstrip())
+    if original[lead:trail] == new_text:
+        return False
+
+    editable = [el.tag == _T for el, _ in segments]
+    if not any(editable):
+        return False
+    # owner[k] = index of the segment holding character k of the original text.
+    owner = [i for i, (_, text) in enumerate(segments) for _ in text]
+    # New text for each segment, built up in reading order.
+    pieces = [[] for _ in segments]
+
+    for k in range(lead):
+        pieces[owner[k]].append(original[k])
+
+    old_tokens = _TOKEN_RE.findall(original[lead:trail])
+    new_tokens = _TOKEN_RE.findall(new_text)
+    old_offsets = _char_offsets(old_tokens)
+    new_offsets = _char_offsets(new_tokens)
+
+    for tag, i1, i2, j1, j2 in _opcodes(old_tokens, new_tokens):
+        a1, a2 = lead + old_offsets[i1], lead + old_offsets[i2]
+        if tag == "equal":
+            for k in range(a1, a2):
+                pieces[owner[k]].append(original[k])
+            continue
+
+        replacement = new_text[new_offsets[j1]:new_offsets[j2]]
+        if a2 > a1:
+            # Replacement text goes to the run that held the start of the old span.
+            target = owner[a1]
+            mappable = all(editable[owner[k]] for k in range(a1, a2))
+        else:
+            # Pure insertions extend the run before them, or else the one after.
+            before = owner[a1 - 1] if a1 > 0 else None
+            after = owner[a1] if a1 < len(original) else None
+            target = before if before is not None and editable[before] else after
+            mappable = target is not None and editable[target]
+        if not mappable or "\t" in replacement or "\n" in replacement:
+            # The edit adds or removes a tab or line break; it can't be mapped onto the runs.
+            return _rewrite_all(segments, lead, trail, original, new_text)
+        pieces[target].append(replacement)
+
+    for k in range(trail, len(original)):
+        pieces[owner[k]].append(original[k])
+
+    _apply(segments, editable, pieces)
+    return True
+
+
+def _text_elements(text):
+    """`w:t`, `w:tab` and `w:br` elements for `text`, mapping characters as `CT_R.text` does."""
+    elements = []
+    for part in _CONTROL_RE.split(text):
+        if part == "\t":
+            elements.append(OxmlElement("w:tab"))
+        elif part in ("\n", "\r"):
+            elements.append(OxmlElement("w:br"))
+        elif part:
+            t = OxmlElement("w:t")
+            _set_text(t, part)
+            elements.append(t)
+    return elements
+
+
+def _rewrite_all(segments, lead, trail, original, new_text):
+    """
+    Coarse fallback: put the whole text in the first run that holds paragraph text
+    (keeping that run's formatting) and empty the text of the others. Only text
+    pieces are replaced; footnote references, drawings, fields etc. stay in place.
+    """
+    first = next(el for el, _ in segments if el.tag == _T).getparent()
+    position = first.index(next(el for el, _ in segments if el.getparent() is first))
+    for el, _ in segments:
+        el.getparent().remove(el)
+    for offset, el in enumerate(_text_elements(original[:lead] + new_text + original[trail:])):
+        first.insert(position + offset, el)
+    return True
+
+
+def _apply(segments, editable, pieces):
+    for (el, text), is_text, new_pieces in zip(segments, editable, pieces):
+        updated = "".join(new_pieces)
+        if is_text and updated != text:
+            _set_text(el, updated)
@@ -0,0 +1,70 @@
+# docx_traversal.py
+"""
+Find every paragraph in a document that holds editable text.
+
+`Document.paragraphs` only covers top-level body paragraphs, and walking
+`table.rows[...].cells` through python-docx visits merged cells once per grid
+position. Instead we walk the XML of each story part once:
+
+  - the main body, including nested tables, text boxes and content controls,
+  - every header and footer part (each shared part only once),
+  - footnotes and endnotes.
+
+Every `w:p` element is yielded exactly once, in document order.
+"""
+
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.oxml import serialize_part_xml
+from docx.opc.part import XmlPart
+from docx.oxml.ns import qn
+from docx.oxml.parser import parse_xml
+
+_P = qn("w:p")
+# Legacy (VML) copies of text boxes; Word reads the mc:Choice version instead.
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+_STORY_RELTYPES = (RT.HEADER, RT.FOOTER, RT.FOOTNOTES, RT.ENDNOTES)
+
+
+def load_stories(doc):
+    """
+    Return [(part, root_element, is_parsed)] for every story part of `doc`.
+    python-docx has no part class for footnotes/endnotes, so those are parsed
+    here (`is_parsed`) and must be written back with `save_stories`.
+    """
+    stories = [(doc.part, doc.element.body, False)]
+    seen = set()
+    for rel in doc.part.rels.values():
+        if rel.is_external or rel.reltype not in _STORY_RELTYPES:
+            continue
+        part = rel.target_part
+        if part.partname in seen:
+            continue
+        seen.add(part.partname)
+        if isinstance(part, XmlPart):
+            stories.append((part, part.element, False))
+        else:
+            stories.append((part, parse_xml(part.blob), True))
+    return stories
+
+
+def iter_paragraphs(stories):
+    """Yield every `w:p` element in `stories`, skipping legacy text box copies."""
+    for _, root, _ in stories:
+        stack = [root]
+        while stack:
+            el = stack.pop()
+            if el.tag == _MC_FALLBACK:
+                continue
+            if el.tag == _P:
+                yield el
+            # Keep descending: paragraphs can hold text boxes with paragraphs of their own.
+            # Children are pushed in reverse so they pop in document order.
+            stack.extend(reversed(el))
+
+
+def save_stories(stories):
+    """Write edits to parsed (non-XmlPart) stories back into their parts."""
+    for part, root, is_parsed in stories:
+        if is_parsed:
+            part._blob = serialize_part_xml(root)
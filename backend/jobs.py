@@ -0,0 +1,172 @@
+# jobs.py
+"""
+Persistence helpers for the background job queue.
+
+The API creates `Job` rows; worker processes (worker.py) claim them, report
+progress, and store the fixed document. Claiming is an atomic conditional
+UPDATE, so any number of worker processes can poll the same table safely.
+"""
+
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import or_, and_
+from sqlalchemy.exc import SQLAlchemyError
+
+import models
+import usage
+
+# A running job whose worker hasn't reported in this long is handed to another worker.
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs (and their stored documents) are deleted after this many hours.
+JOB_RETENTION_HOURS = int(os.getenv("JOB_RETENTION_HOURS", "24"))
+# ...checked for at most this often (seconds) by each worker and API process.
+JOB_PURGE_INTERVAL = float(os.getenv("JOB_PURGE_INTERVAL", "600"))
+
+_last_purge = 0.0
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def create_job(db, user_id, file_name, contents, ip_address=None):
+    """Store an upload as a new queued job and return it."""
+    job = models.Job(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        file_name=file_name,
+        ip_address=ip_address,
+        status="queued",
+        paragraphs_done=0,
+        paragraphs_total=0,
+        attempts=0,
+        input_data=contents,
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+def create_completed_job(db, user_id, file_name, result, ip_address=None, paragraphs_skipped=0, paragraphs_reused=0):
+    """Store a result that was produced in-request (e.g. by the streaming endpoint) so it can be downloaded later."""
+    job = models.Job(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        file_name=file_name,
+        ip_address=ip_address,
+        status="running",
+        paragraphs_done=0,
+        paragraphs_total=0,
+        attempts=1,
+        started_at=_now(),
+    )
+    db.add(job)
+    complete_job(db, job, result, paragraphs_skipped, paragraphs_reused)
+    # Streamed results are stored here even when no worker runs, so purge on write too.
+    maybe_purge_finished_jobs(db)
+    return job
+
+
+def _claimable():
+    stale_before = _now() - timedelta(seconds=JOB_STALE_SECONDS)
+    return or_(
+        models.Job.status == "queued",
+        and_(models.Job.status == "running", models.Job.heartbeat_at < stale_before),
+    )
+
+
+def claim_next_job(db):
+    """
+    Atomically mark the oldest claimable job as running and return it, or None.
+    Jobs that have already used up their attempts are failed instead.
+    """
+    candidates = (
+        db.query(models.Job.id)
+        .filter(_claimable())
+        .order_by(models.Job.created_at)
+        .limit(10)
+        .all()
+    )
+    for (job_id,) in candidates:
+        now = _now()
+        claimed = (
+            db.query(models.Job)
+            .filter(models.Job.id == job_id, _claimable())
+            .update({
+                models.Job.status: "running",
+                models.Job.started_at: now,
+                models.Job.heartbeat_at: now,
+                models.Job.attempts: models.Job.attempts + 1,
+            }, synchronize_session=False)
+        )
+        db.commit()
+        if not claimed:
+            # Another worker got there first.
+            continue
+        job = db.get(models.Job, job_id)
+        if job.attempts > JOB_MAX_ATTEMPTS:
+            fail_job(db, job, "Job was abandoned by its worker too many times.")
+            continue
+        return job
+    return None
+
+
+def update_progress(db, job_id, done, total):
+    db.query(models.Job).filter(models.Job.id == job_id).update({
+        models.Job.paragraphs_done: done,
+        models.Job.paragraphs_total: total,
+        models.Job.heartbeat_at: _now(),
+    }, synchronize_session=False)
+    db.commit()
+
+
+def complete_job(db, job, result, paragraphs_skipped=0, paragraphs_reused=0):
+    """
+    Store the fixed document and add it to the user's history, in one transaction.
+    Its usage slot was already reserved when the job was created.
+    """
+    job.status = "done"
+    job.result_data = result
+    job.input_data = None
+    job.finished_at = _now()
+    job.paragraphs_done = job.paragraphs_total
+    job.paragraphs_skipped = paragraphs_skipped
+    job.paragraphs_reused = paragraphs_reused
+    db.add(models.ProcessedFile(user_id=job.user_id, file_name=job.file_name, ip_address=job.ip_address))
+    db.commit()
+
+
+def fail_job(db, job, error):
+    """Mark the job failed and give its usage slot back, in one transaction."""
+    job.status = "failed"
+    job.error = str(error)
+    job.input_data = None
+    job.finished_at = _now()
+    usage.release(db, job.user_id, usage.period_start(job.created_at, job.owner.plan))
+
+
+def purge_finished_jobs(db):
+    """Delete finished jobs older than the retention window. Returns the number removed."""
+    cutoff = _now() - timedelta(hours=JOB_RETENTION_HOURS)
+    removed = db.query(models.Job).filter(
+        models.Job.status.in_(("done", "failed")), models.Job.finished_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return removed
+
+
+def maybe_purge_finished_jobs(db):
+    """purge_finished_jobs, if this process hasn't run it in the last JOB_PURGE_INTERVAL seconds."""
+    global _last_purge
+    if time.monotonic() - _last_purge > JOB_PURGE_INTERVAL:
+        _last_purge = time.monotonic()
+        try:
+            purge_finished_jobs(db)
+        except SQLAlchemyError as e:
+            # Not worth failing a request over; try again next interval.
+            db.rollback()
+            print(f"Purging finished jobs failed: {e}")
@@ -1,25 +1,41 @@
 import os
+import asyncio
+import io
+import json
+import math
+import posixpath
+import zipfile
 from datetime import datetime, timedelta, timezone
-from typing import Annotated
+from typing import Annotated, List, Optional
+from urllib.parse import quote
 
 from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Request
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-import stripe
+from pydantic import ValidationError
 
 # Import our modules
-from database import SessionLocal, engine, Base
+from database import AsyncSessionLocal, async_engine, ensure_schema
 import models
 import schemas
-from process_docx import fix_document
-
-# Create all database tables on startup if they don't exist
-# Note: For schema changes (like adding a column), use Alembic migrations.
-Base.metadata.create_all(bind=engine)
+import jobs
+import usage
+from process_docx import (
+    fix_docx_bytes, fix_docx_batch, check_docx_archive, docx_files_in_zip, DocumentTooLargeError,
+    MAX_UPLOAD_BYTES, MAX_BULK_UPLOAD_BYTES, BULK_MAX_DOCUMENTS,
+)
+from model_backends import check_backends
+from paragraph_cache import paragraph_cache
+from auth_cache import auth_cache, AuthUser
+from passwords import hash_password, verify_and_update, PasswordHasherBusy
+import rate_limit
+from rate_limit import RateLimited
+import metrics
 
 # --- Configuration & Setup ---
 app = FastAPI(title="SmartDocFixer API", version="2.0.0")
@@ -30,8 +46,9 @@ STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 STRIPE_PRO_PRICE_ID = os.getenv("STRIPE_PRO_PRICE_ID")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://127.0.0.1:8080")
 SECRET_KEY = os.getenv("SECRET_KEY", "a_very_secret_key_for_development")
-
-stripe.api_key = STRIPE_SECRET_KEY
+# Reverse proxies in front of the API that append the caller's address to
+# X-Forwarded-For (Render and Railway have one). 0 = clients connect directly.
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", "1"))
 
 # IMPORTANT: For production, restrict this to your frontend's actual URL
 app.add_middleware(
@@ -40,28 +57,49 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # So the frontend can read the paragraph counts of a fixed document.
+    expose_headers=["Content-Disposition", "X-Paragraphs-Total", "X-Paragraphs-Skipped",
+                    "X-Paragraphs-Skipped-Reasons", "X-Paragraphs-Reused", "X-Paragraphs-Rewritten",
+                    "X-Documents-Fixed", "X-Documents-Failed", "X-Request-ID"],
 )
+# Added last, so it wraps everything else: request ids and latency for every response.
+app.add_middleware(metrics.MetricsMiddleware)
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    # Close pooled connections cleanly instead of letting them drop at exit.
+    await async_engine.dispose()
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "The server is busy. Please try again in a moment."},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Too many requests. Please slow down and try again shortly."},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
 
 # --- Security & Authentication ---
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # Token expires in 7 days
+DOWNLOAD_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 # --- Helper Functions ---
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    """An AsyncSession per request. Sync helpers (jobs.py, usage.py) run through `db.run_sync`."""
+    # Tables are created on the first request that needs them, not at import.
+    await ensure_schema()
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -72,7 +110,14 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
+def create_download_token(job_id: str):
+    """Short-lived token that lets a browser fetch one job result without an Authorization header."""
+    return create_access_token(
+        data={"sub": job_id, "type": "download"},
+        expires_delta=timedelta(minutes=DOWNLOAD_TOKEN_EXPIRE_MINUTES)
+    )
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -81,30 +126,64 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Se
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        # Download tokens are signed with the same key but name a job, not a user.
+        if email is None or payload.get("type") == "download":
             raise credentials_exception
         token_data = schemas.TokenData(email=email)
-    except JWTError:
+    except (JWTError, ValidationError):
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
+    # Served from the auth cache for most requests; see auth_cache.py.
+    user = await auth_cache.get_user(db, token_data.email)
     if user is None:
         raise credentials_exception
     return user
 
 def get_client_ip(request: Request):
-    x_forwarded_for = request.headers.get('x-forwarded-for')
-    if x_forwarded_for:
-        return x_forwarded_for.split(',')[0]
-    return request.client.host
+    """
+    The caller's address as seen by our outermost trusted proxy. Entries to the left
+    of the ones our proxies added come from the client and can be anything, so they
+    are never used (the rate limits are keyed on this).
+    """
+    hops = [hop.strip() for hop in request.headers.get('x-forwarded-for', '').split(',') if hop.strip()]
+    if TRUSTED_PROXIES > 0 and hops:
+        return hops[-min(TRUSTED_PROXIES, len(hops))]
+    return request.client.host if request.client else "unknown"
 
 # --- API Endpoints ---
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the SmartDocFixer API"}
 
+@app.get("/ready")
+async def readiness():
+    """
+    Readiness probe: the database is reachable with its tables in place, and the model
+    backend of every plan is configured and reachable. 503 until both pass.
+    """
+    checks = {}
+    try:
+        await ensure_schema()
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"error: {e}"
+    try:
+        await check_backends()
+        checks["model"] = "ok"
+    except Exception as e:
+        checks["model"] = f"error: {e}"
+
+    ready = all(result == "ok" for result in checks.values())
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if ready else "not ready", "checks": checks}
+    )
+
 @app.post("/signup", response_model=schemas.Token)
-async def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def signup(request: Request, user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user."""
+    rate_limit.check_auth(get_client_ip(request))
     email = user.email
     password = user.password
 
@@ -113,16 +192,17 @@ async def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
     if len(password) < 6:
         raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
     
-    db_user = db.query(models.User).filter(models.User.email == email).first()
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    db_user = result.scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = get_password_hash(password)
+    hashed_password = await hash_password(password)
     new_user = models.User(email=email, password_hash=hashed_password, plan="free")
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -132,15 +212,28 @@ async def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer", "plan": new_user.plan}
 
 @app.post("/login", response_model=schemas.Token)
-async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: Session = Depends(get_db)):
+async def login(
+    request: Request,
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    db: AsyncSession = Depends(get_db)
+):
     """User login to get an access token."""
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+    rate_limit.check_auth(get_client_ip(request))
+    result = await db.execute(select(models.User).where(models.User.email == form_data.username))
+    user = result.scalars().first()
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await verify_and_update(form_data.password, user.password_hash)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Stored with an outdated work factor (BCRYPT_ROUNDS changed); upgrade it now.
+        user.password_hash = new_hash
+        await db.commit()
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -150,42 +243,143 @@ async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db:
     return {"access_token": access_token, "token_type": "bearer", "plan": user.plan}
 
 @app.get("/users/me", response_model=schemas.User)
-async def read_users_me(current_user: Annotated[models.User, Depends(get_current_user)]):
+async def read_users_me(current_user: Annotated[AuthUser, Depends(get_current_user)]):
     """Get current user's details."""
     return current_user
 
 # --- Document Processing Endpoint ---
 FREE_TIER_LIMIT = 3
 PRO_TIER_LIMIT = 1000
+DOCX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+UPLOAD_CHUNK_SIZE = 64 * 1024
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
+async def read_upload(file: UploadFile, limit: int, too_large: str) -> bytes:
+    """Read an upload into memory, refusing it (413, `too_large`) as soon as it passes `limit` bytes."""
+    chunks, size = [], 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=too_large)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+async def read_docx_upload(file: UploadFile) -> bytes:
+    """
+    Read an uploaded .docx into memory, refusing it as soon as it passes MAX_UPLOAD_BYTES
+    and before parsing if its zip central directory looks oversized (zip bombs).
+    """
+    if not file.filename.endswith('.docx'):
+        raise HTTPException(status_code=400, detail="Only .docx files are supported.")
+
+    with metrics.stage("upload_read"):
+        contents = await read_upload(
+            file, MAX_UPLOAD_BYTES, f"Files larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB are not supported."
+        )
+        try:
+            check_docx_archive(contents)
+        except DocumentTooLargeError as e:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return contents
+
+def report_headers(report: dict) -> dict:
+    """The paragraph counts from `fix_docx_bytes`, as response headers."""
+    reasons = sorted(report["skipped_by_reason"].items())
+    return {
+        "X-Paragraphs-Total": str(report["paragraphs"]),
+        "X-Paragraphs-Skipped": str(report["skipped"]),
+        "X-Paragraphs-Skipped-Reasons": ", ".join(f"{reason}={count}" for reason, count in reasons),
+        "X-Paragraphs-Reused": str(report["reused"]),
+        "X-Paragraphs-Rewritten": str(report["rewritten"]),
+    }
+
+def content_disposition(file_name: str) -> str:
+    """
+    `attachment` header for a download name. Headers are latin-1, so non-ASCII names
+    go in RFC 5987 `filename*`, with an ASCII approximation in `filename` for old clients.
+    """
+    fallback = "".join(c if " " <= c <= "~" else "_" for c in file_name)
+    fallback = fallback.replace("\\", "\\\\").replace('"', '\\"')
+    return f"attachment; filename=\"{fallback}\"; filename*=utf-8''{quote(file_name, safe='')}"
+
+def docx_response(data: bytes, file_name: str, extra_headers: Optional[dict] = None,
+                  media_type: str = DOCX_MEDIA_TYPE) -> StreamingResponse:
+    """Stream an in-memory .docx (or other file) back to the client in chunks."""
+    def iter_chunks():
+        for start in range(0, len(data), RESPONSE_CHUNK_SIZE):
+            yield data[start:start + RESPONSE_CHUNK_SIZE]
+
+    return StreamingResponse(
+        iter_chunks(),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": content_disposition(file_name),
+            "Content-Length": str(len(data)),
+            **(extra_headers or {}),
+        }
+    )
+
+def plan_limit(plan: str):
+    """Documents per billing period for a plan, or None for no limit."""
+    return {"free": FREE_TIER_LIMIT, "pro": PRO_TIER_LIMIT}.get(plan)
+
+def raise_usage_limit(plan: str, batch_size: int = 1):
+    if batch_size > 1:
+        # A bulk upload that doesn't fit in what is left of the plan.
+        raise HTTPException(
+            status_code=status.HTTP_402_PAYMENT_REQUIRED if plan == "free" else status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={"error": "Batch over limit", "message": f"This batch has {batch_size} documents, more than your plan has left{'' if plan == 'free' else ' this month'}.", "action": "upgrade" if plan == "free" else "contact_support"}
+        )
+    if plan == "free":
+        raise HTTPException(
+            status_code=status.HTTP_402_PAYMENT_REQUIRED,
+            detail={"error": "Upgrade required", "message": f"You have reached your limit of {FREE_TIER_LIMIT} free documents. Upgrade to Pro for more!", "action": "upgrade"}
+        )
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail={"error": "Monthly limit reached", "message": f"You have reached your generous monthly limit of {PRO_TIER_LIMIT} documents.", "action": "contact_support"}
+    )
+
+def check_usage_limit(user: AuthUser):
+    """Cheap early rejection from the cached usage count, before the upload is read."""
+    limit = plan_limit(user.plan)
+    if limit is not None and user.usage_count >= limit:
+        raise_usage_limit(user.plan)
+
+async def reserve_usage(db: AsyncSession, user: AuthUser, count: int = 1):
+    """
+    Atomically count `count` documents against the user's plan, or raise if they don't fit.
+    Returns the usage period they were counted in, for `release_usage`.
+    """
+    period = await db.run_sync(usage.reserve, user.id, plan_limit(user.plan), count, user.plan)
+    if period is None:
+        raise_usage_limit(user.plan, count)
+    await auth_cache.invalidate(user.email)
+    return period
+
+async def release_usage(db: AsyncSession, user_id: int, email: str, period, count: int = 1):
+    """Give the slots back, in the period `reserve_usage` took them from, for documents that were not delivered."""
+    await db.run_sync(usage.release, user_id, period, count)
+    await auth_cache.invalidate(email)
 
 @app.post("/fix-document/")
 async def upload_and_fix(
     request: Request,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """Upload, validate, and fix a document."""
-    if not file.filename.endswith('.docx'):
-        raise HTTPException(status_code=400, detail="Only .docx files are supported.")
+    check_usage_limit(current_user)
+    rate_limit.check_upload(current_user.id, current_user.plan, get_client_ip(request))
+    contents = await read_docx_upload(file)
+    period = await reserve_usage(db, current_user)
 
-    usage_count = len(current_user.processed_files)
-    
-    if current_user.plan == "free" and usage_count >= FREE_TIER_LIMIT:
-        raise HTTPException(
-            status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            detail={"error": "Upgrade required", "message": f"You have reached your limit of {FREE_TIER_LIMIT} free documents. Upgrade to Pro for more!", "action": "upgrade"}
-        )
-    
-    if current_user.plan == "pro" and usage_count >= PRO_TIER_LIMIT:
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail={"error": "Monthly limit reached", "message": f"You have reached your generous monthly limit of {PRO_TIER_LIMIT} documents.", "action": "contact_support"}
-        )
-    
     try:
         ip_address = get_client_ip(request)
-        output_path = await fix_document(file)
+        fixed, report = await fix_docx_bytes(contents, plan=current_user.plan, user_id=current_user.id)
 
         # Track usage in the database by creating a ProcessedFile record
         new_file_record = models.ProcessedFile(
@@ -194,24 +388,317 @@ async def upload_and_fix(
             ip_address=ip_address
         )
         db.add(new_file_record)
-        db.commit()
+        await db.commit()
         
-        return FileResponse(
-            path=output_path,
-            media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            filename=f"fixed_{file.filename}"
-        )
+        return docx_response(fixed, f"fixed_{file.filename}", report_headers(report))
     except Exception as e:
         print(f"Error processing document: {e}")
+        await db.rollback()
+        await release_usage(db, current_user.id, current_user.email, period)
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred while processing the document: {e}")
 
+@app.post("/fix-document/stream")
+async def upload_and_fix_stream(
+    request: Request,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """
+    Fix a document while streaming progress as Server-Sent Events.
+
+    Emits `progress` events ({"done", "total"}) as paragraphs finish, then a final
+    `done` event with a download token and the paragraph counts (`report`), or an
+    `error` event. If the client disconnects, the remaining model calls are cancelled.
+    """
+    check_usage_limit(current_user)
+    rate_limit.check_upload(current_user.id, current_user.plan, get_client_ip(request))
+    contents = await read_docx_upload(file)
+    period = await reserve_usage(db, current_user)
+    file_name = file.filename
+    user_id = current_user.id
+    user_email = current_user.email
+    plan = current_user.plan
+    ip_address = get_client_ip(request)
+    events = asyncio.Queue()
+
+    def on_progress(done, total):
+        events.put_nowait(("progress", {"done": done, "total": total}))
+
+    async def run():
+        # Our own session: the request's one may be closed before the stream ends.
+        async with AsyncSessionLocal() as task_db:
+            async def give_back():
+                await task_db.rollback()
+                await release_usage(task_db, user_id, user_email, period)
+
+            try:
+                result, report = await fix_docx_bytes(contents, on_progress=on_progress, plan=plan, user_id=user_id)
+                with metrics.stage("store"):
+                    job = await task_db.run_sync(
+                        jobs.create_completed_job, user_id, file_name, result,
+                        ip_address=ip_address, paragraphs_skipped=report["skipped"],
+                        paragraphs_reused=report["reused"]
+                    )
+                token = create_download_token(job.id)
+                events.put_nowait(("done", {"download_token": token, "download_url": f"/downloads/{token}", "report": report}))
+            except asyncio.CancelledError:
+                # The client disconnected; give the slot back even though we are being cancelled.
+                await asyncio.shield(give_back())
+                raise
+            except Exception as e:
+                print(f"Error processing document: {e}")
+                try:
+                    # Before the error event, which ends the stream.
+                    await give_back()
+                finally:
+                    events.put_nowait(("error", {"detail": f"An unexpected error occurred while processing the document: {e}"}))
+
+    async def event_stream():
+        task = asyncio.create_task(run())
+        finished = False
+        try:
+            while True:
+                event, data = await events.get()
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                if event in ("done", "error"):
+                    finished = True
+                    break
+        finally:
+            if not finished:
+                # The client went away mid-stream: stop fixing the document.
+                task.cancel()
+        await task
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- Bulk Upload Endpoint ---
+ZIP_MEDIA_TYPE = "application/zip"
+
+async def read_bulk_upload(files: List[UploadFile]) -> list:
+    """
+    Read the files of a bulk upload: .docx files and .zip archives of them. Returns
+    [(file name, bytes or an error message)]; a file that can't be used gets its error
+    in the batch report instead of failing the request. The whole request is refused
+    (413) past MAX_BULK_UPLOAD_BYTES, before or after unpacking, or BULK_MAX_DOCUMENTS.
+    """
+    too_large = f"Batches larger than {MAX_BULK_UPLOAD_BYTES // (1024 * 1024)} MB are not supported."
+    too_many = f"A batch can hold at most {BULK_MAX_DOCUMENTS} documents."
+    documents, uploaded = [], 0
+    with metrics.stage("upload_read"):
+        for file in files:
+            contents = await read_upload(file, MAX_BULK_UPLOAD_BYTES - uploaded, too_large)
+            uploaded += len(contents)
+            name = file.filename or "document.docx"
+            if name.lower().endswith(".zip"):
+                unpacked = sum(len(c) for _, c in documents if isinstance(c, bytes))
+                try:
+                    documents.extend(docx_files_in_zip(
+                        contents, BULK_MAX_DOCUMENTS - len(documents), MAX_BULK_UPLOAD_BYTES - unpacked
+                    ))
+                except DocumentTooLargeError as e:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+                except ValueError as e:
+                    documents.append((name, str(e)))
+            elif name.lower().endswith(".docx"):
+                documents.append((name, contents))
+            else:
+                documents.append((name, "Only .docx and .zip files are supported."))
+            if len(documents) > BULK_MAX_DOCUMENTS:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=too_many)
+
+        checked = []
+        for name, contents in documents:
+            if isinstance(contents, bytes):
+                try:
+                    check_docx_archive(contents)
+                except ValueError as e:
+                    contents = str(e)
+            checked.append((name, contents))
+    return checked
+
+def bulk_output_name(name: str, taken: set) -> str:
+    """`fixed_<file name>` for a document of a batch, without its folders and unique in the batch."""
+    stem, ext = posixpath.splitext("fixed_" + posixpath.basename(name.replace("\\", "/")))
+    output, n = stem + ext, 2
+    while output in taken:
+        output, n = f"{stem} ({n}){ext}", n + 1
+    taken.add(output)
+    return output
+
+def build_bulk_zip(files: list, report: list) -> bytes:
+    """A .zip of the fixed documents ([(name, bytes)]) and `report.json`."""
+    buf = io.BytesIO()
+    # .docx files are compressed already.
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+        archive.writestr("report.json", json.dumps(report, indent=2))
+    return buf.getvalue()
+
+@app.post("/fix-document/bulk")
+async def upload_and_fix_bulk(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """
+    Fix several documents in one request: any mix of .docx files and .zip archives of them.
+
+    The batch takes one quota reservation for all its documents, and their paragraphs
+    share one model queue, so requests are batched and cached across documents.
+    Returns a .zip of the fixed documents with `report.json`, a per-file report.
+    Files that can't be read or fixed are listed there with their error and don't
+    count against the quota; the rest of the batch is still delivered.
+    """
+    check_usage_limit(current_user)
+    uploads = await read_bulk_upload(files)
+    documents = [contents for _, contents in uploads if isinstance(contents, bytes)]
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No documents were uploaded.")
+    # One upload token per document, like sending them one at a time.
+    rate_limit.check_upload(current_user.id, current_user.plan, get_client_ip(request), count=max(1, len(documents)))
+    if documents:
+        period = await reserve_usage(db, current_user, count=len(documents))
+
+    try:
+        ip_address = get_client_ip(request)
+        outcomes = iter(
+            await fix_docx_batch(documents, plan=current_user.plan, user_id=current_user.id) if documents else []
+        )
+
+        report, fixed_files, taken = [], [], set()
+        for name, contents in uploads:
+            outcome = next(outcomes) if isinstance(contents, bytes) else contents
+            if isinstance(outcome, tuple):
+                fixed, doc_report = outcome
+                output = bulk_output_name(name, taken)
+                fixed_files.append((output, fixed))
+                report.append({"file": name, "status": "fixed", "output": output, **doc_report})
+                db.add(models.ProcessedFile(user_id=current_user.id, file_name=name, ip_address=ip_address))
+            else:
+                report.append({"file": name, "status": "failed", "error": str(outcome)})
+        await db.commit()
+    except Exception as e:
+        print(f"Error processing batch: {e}")
+        await db.rollback()
+        if documents:
+            await release_usage(db, current_user.id, current_user.email, period, count=len(documents))
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred while processing the documents: {e}")
+
+    # Give back the slots of documents that failed after their slot was reserved.
+    failed = len(documents) - len(fixed_files)
+    if failed:
+        await release_usage(db, current_user.id, current_user.email, period, count=failed)
+    print(f"Batch of {len(uploads)} files: {len(fixed_files)} fixed, {len(uploads) - len(fixed_files)} failed.")
+
+    data = await asyncio.to_thread(build_bulk_zip, fixed_files, report)
+    return docx_response(data, "fixed_documents.zip", {
+        "X-Documents-Fixed": str(len(fixed_files)),
+        "X-Documents-Failed": str(len(uploads) - len(fixed_files)),
+    }, media_type=ZIP_MEDIA_TYPE)
+
+@app.get("/downloads/{token}")
+async def download_with_token(token: str, db: AsyncSession = Depends(get_db)):
+    """Download a fixed document using the token from a streaming fix."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=404, detail="Download link is invalid or has expired.")
+    if payload.get("type") != "download":
+        raise HTTPException(status_code=404, detail="Download link is invalid or has expired.")
+
+    job = await db.get(models.Job, payload.get("sub"), options=[undefer(models.Job.result_data)])
+    if job is None or job.status != "done":
+        raise HTTPException(status_code=404, detail="Download link is invalid or has expired.")
+    return job_result_response(job)
+
+# --- Background Job Endpoints ---
+async def get_user_job(db: AsyncSession, job_id: str, user: AuthUser, options=()) -> models.Job:
+    job = await db.get(models.Job, job_id, options=options)
+    if job is None or job.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def job_result_response(job: models.Job) -> StreamingResponse:
+    """Stream a finished job's document."""
+    return docx_response(job.result_data, f"fixed_{job.file_name}")
+
+@app.post("/jobs", response_model=schemas.JobCreated, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(
+    request: Request,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """Queue a document for background fixing and return its job id right away."""
+    check_usage_limit(current_user)
+    rate_limit.check_upload(current_user.id, current_user.plan, get_client_ip(request))
+    contents = await read_docx_upload(file)
+    period = await reserve_usage(db, current_user)
+    try:
+        job = await db.run_sync(jobs.create_job, current_user.id, file.filename, contents, ip_address=get_client_ip(request))
+    except Exception as e:
+        print(f"Error queueing document: {e}")
+        await db.rollback()
+        await release_usage(db, current_user.id, current_user.email, period)
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred while queueing the document: {e}")
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/jobs/{job_id}", response_model=schemas.JobStatus)
+async def read_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """Status and paragraph progress of a queued job."""
+    return await get_user_job(db, job_id, current_user)
+
+@app.get("/jobs/{job_id}/result")
+async def download_job_result(
+    job_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """Stream the fixed .docx of a finished job."""
+    # Deferred columns can't be lazy-loaded on an AsyncSession; load the document up front.
+    job = await get_user_job(db, job_id, current_user, options=[undefer(models.Job.result_data)])
+    if job.status == "failed":
+        raise HTTPException(status_code=422, detail=f"Job failed: {job.error}")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is not finished yet (status: {job.status}).")
+    return job_result_response(job)
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters and size of the paragraph result cache for this worker."""
+    return paragraph_cache.stats()
+
+@app.get("/metrics")
+def read_metrics():
+    """Prometheus metrics: request latency, document stages, model calls, caches and pools (see metrics.py)."""
+    data, content_type = metrics.render()
+    return Response(content=data, headers={"Content-Type": content_type})
+
 # --- Stripe & Payment Endpoints ---
+def get_stripe():
+    """The stripe module, imported on first use rather than at startup."""
+    import stripe
+    stripe.api_key = STRIPE_SECRET_KEY
+    return stripe
+
 @app.post("/create-checkout-session")
 async def create_checkout_session(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """Creates a Stripe checkout session for a user to upgrade to Pro."""
+    stripe = get_stripe()
     try:
         checkout_session = stripe.checkout.Session.create(
             line_items=[{'price': STRIPE_PRO_PRICE_ID, 'quantity': 1}],
@@ -227,10 +714,11 @@ async def create_checkout_session(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/stripe-webhook")
-async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
+async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_db)):
     """Listens for events from Stripe to confirm successful payments."""
     payload = await request.body()
     sig_header = request.headers.get('stripe-signature')
+    stripe = get_stripe()
     event = None
 
     try:
@@ -248,11 +736,12 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
         stripe_customer_id = session.get('customer')
 
         if user_id:
-            user = db.query(models.User).filter(models.User.id == int(user_id)).first()
+            user = await db.get(models.User, int(user_id))
             if user:
                 user.plan = 'pro'
                 user.stripe_customer_id = stripe_customer_id
-                db.commit()
+                await db.commit()
+                await auth_cache.invalidate(user.email)
                 print(f"User {user.email} (ID: {user_id}) successfully upgraded to Pro.")
 
     return JSONResponse(status_code=200, content={"status": "success"})
\ No newline at end of file
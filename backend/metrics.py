@@ -0,0 +1,180 @@
+# metrics.py
+"""
+Prometheus metrics and per-stage tracing.
+
+`GET /metrics` serves, in the Prometheus text format:
+  - http_request_duration_seconds: request latency by method, route and status
+    (to the last byte sent, so a streaming fix counts until its final event);
+  - document_stage_seconds: time per document stage (upload_read, parse,
+    history_lookup, model, history_save, rewrite, save, store);
+  - model_request_seconds, model_tokens_total, model_retries_total and
+    model_fallbacks_total: every model call attempt by backend and outcome, the
+    tokens it used, retries, and paragraphs that kept their original text;
+  - cache_lookups_total: paragraph cache, document history and auth cache hits
+    and misses;
+  - db_pool_connections and model_slots: live pool and scheduler usage.
+
+Every HTTP request gets a request id (the client's X-Request-ID, or a new one),
+returned in the X-Request-ID response header. Each stage span is also written to
+the log as one JSON line carrying that id, e.g.
+    {"event": "stage", "stage": "parse", "seconds": 0.041, "request_id": "..."}
+Background jobs use their job id. STAGE_LOGS=false keeps the spans out of the log.
+
+Metrics are kept per process. With several API or worker processes, point
+PROMETHEUS_MULTIPROC_DIR at an empty directory shared by all of them (and wipe it
+on deploy) and /metrics reports their totals; the live gauges are then the
+answering process's own.
+"""
+
+import os
+import json
+import time
+import uuid
+import contextvars
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+STAGE_LOGS = os.getenv("STAGE_LOGS", "true").lower() == "true"
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Documents take from milliseconds (a cached letter) to minutes (a manuscript).
+_SLOW_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ["method", "route", "status"],
+    buckets=_SLOW_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "document_stage_seconds", "Time spent in each stage of fixing a document.", ["stage"],
+    buckets=_SLOW_BUCKETS,
+)
+MODEL_LATENCY = Histogram(
+    "model_request_seconds", "Latency of one model call attempt.", ["backend", "outcome"],
+    buckets=_SLOW_BUCKETS,
+)
+MODEL_TOKENS = Counter("model_tokens", "Tokens used by model calls.", ["backend", "kind"])
+MODEL_RETRIES = Counter("model_retries", "Model call attempts retried after a transient error.", ["backend"])
+MODEL_FALLBACKS = Counter(
+    "model_fallbacks",
+    "Paragraphs that kept their original text (error, truncated, empty) or batches re-sent one paragraph "
+    "at a time (batch_split).",
+    ["reason"],
+)
+CACHE_LOOKUPS = Counter("cache_lookups", "Cache lookups by cache and result.", ["cache", "result"])
+
+# --- Request id ---
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def log_event(event, **fields):
+    """Write one structured (JSON) log line, tagged with the current request id."""
+    print(json.dumps({"event": event, **fields, "request_id": request_id.get()}, default=str))
+
+
+def record_stage(name, seconds, **fields):
+    STAGE_SECONDS.labels(name).observe(seconds)
+    if STAGE_LOGS:
+        log_event("stage", stage=name, seconds=round(seconds, 4), **fields)
+
+
+@contextmanager
+def stage(name, **fields):
+    """`with stage("parse"):` times the block as one document stage, failed or not."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        fields["error"] = type(e).__name__
+        raise
+    finally:
+        record_stage(name, time.perf_counter() - start, **fields)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: assigns the request id and records request latency. Routes are
+    labelled by their path template (/jobs/{job_id}), and anything that matched no
+    route as "unmatched", so label values stay bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        rid = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        token = request_id.set(rid)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", rid.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            route = scope.get("route")
+            HTTP_LATENCY.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - start)
+            request_id.reset(token)
+
+
+# --- Live gauges ---
+class _LiveCollector:
+    """Reads database pool and model scheduler usage when /metrics is scraped."""
+
+    def describe(self):
+        # Lets the registry check names without importing the database module.
+        yield GaugeMetricFamily("db_pool_connections", "", labels=["engine", "state"])
+        yield GaugeMetricFamily("model_slots", "", labels=["state"])
+
+    def collect(self):
+        from database import engine, async_engine
+        from scheduler import model_scheduler
+
+        pool = GaugeMetricFamily(
+            "db_pool_connections", "Pooled database connections by engine and state.", labels=["engine", "state"]
+        )
+        for name, pool_engine in (("async", async_engine), ("sync", engine)):
+            p = pool_engine.pool
+            # Null pools (aiosqlite) and SQLite in-memory pools keep no counts.
+            if not hasattr(p, "checkedout"):
+                continue
+            pool.add_metric([name, "checked_out"], p.checkedout())
+            pool.add_metric([name, "idle"], p.checkedin())
+            pool.add_metric([name, "overflow"], max(p.overflow(), 0))
+            pool.add_metric([name, "size"], p.size())
+        yield pool
+
+        stats = model_scheduler.stats()
+        slots = GaugeMetricFamily("model_slots", "Process-wide model request slots (see scheduler.py).", labels=["state"])
+        for state in ("capacity", "in_use", "waiting"):
+            slots.add_metric([state], stats[state])
+        yield slots
+
+
+_live = _LiveCollector()
+REGISTRY.register(_live)
+
+
+def render():
+    """The current metrics in the Prometheus text format, and their content type."""
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_live)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,49 @@
+"""Count free-plan usage over the user's lifetime
+
+Revision ID: a7d3e5f02c18
+Revises: e4b7c2d91a36
+Create Date: 2026-10-18 17:12:44.902317
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e5f02c18'
+down_revision: Union[str, Sequence[str], None] = 'e4b7c2d91a36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# usage.LIFETIME: the period of the free plan's single counter row.
+LIFETIME = date(1970, 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Data only: free users get a lifetime counter with every document they have
+    # ever processed, plus the queued/running jobs that already hold a slot.
+    op.execute(sa.text("""
+        INSERT INTO usage_counters (user_id, period_start, count)
+        SELECT user_id, :lifetime, COUNT(*)
+        FROM (
+            SELECT processed_files.user_id
+            FROM processed_files JOIN users ON users.id = processed_files.user_id
+            WHERE users.plan = 'free'
+            UNION ALL
+            SELECT jobs.user_id
+            FROM jobs JOIN users ON users.id = jobs.user_id
+            WHERE users.plan = 'free' AND jobs.status IN ('queued', 'running')
+        ) AS usage
+        GROUP BY user_id
+    """).bindparams(sa.bindparam('lifetime', LIFETIME, type_=sa.Date())))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(sa.text("DELETE FROM usage_counters WHERE period_start = :lifetime").bindparams(
+        sa.bindparam('lifetime', LIFETIME, type_=sa.Date())
+    ))
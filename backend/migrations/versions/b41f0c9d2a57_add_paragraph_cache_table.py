@@ -0,0 +1,35 @@
+"""Add paragraph_cache table
+
+Revision ID: b41f0c9d2a57
+Revises: 7e713ee4c3c1
+Create Date: 2026-10-18 10:12:44.512093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41f0c9d2a57'
+down_revision: Union[str, Sequence[str], None] = '7e713ee4c3c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('paragraph_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('fixed_text', sa.Text(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_paragraph_cache_expires_at'), 'paragraph_cache', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_paragraph_cache_expires_at'), table_name='paragraph_cache')
+    op.drop_table('paragraph_cache')
@@ -0,0 +1,60 @@
+"""Add usage_counters table and (user_id, processed_at) index on processed_files
+
+Revision ID: d8e2b47a9f13
+Revises: 3c9e5a71d0f4
+Create Date: 2026-10-18 14:26:09.518320
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8e2b47a9f13'
+down_revision: Union[str, Sequence[str], None] = '3c9e5a71d0f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _month_start(column: str) -> str:
+    """SQL for the first day of the (UTC) calendar month of a timestamp column."""
+    if op.get_bind().dialect.name == 'sqlite':
+        return f"date({column}, 'start of month')"
+    return f"CAST(date_trunc('month', {column} AT TIME ZONE 'UTC') AS date)"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('usage_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'period_start')
+    )
+    op.create_index('ix_processed_files_user_id_processed_at', 'processed_files', ['user_id', 'processed_at'], unique=False)
+
+    # Backfill: every processed file counts in its month, and queued/running jobs
+    # already hold a slot in the month they were created.
+    op.execute(f"""
+        INSERT INTO usage_counters (user_id, period_start, count)
+        SELECT user_id, period_start, COUNT(*)
+        FROM (
+            SELECT user_id, {_month_start('processed_at')} AS period_start
+            FROM processed_files
+            WHERE user_id IS NOT NULL AND processed_at IS NOT NULL
+            UNION ALL
+            SELECT user_id, {_month_start('created_at')} AS period_start
+            FROM jobs
+            WHERE status IN ('queued', 'running') AND created_at IS NOT NULL
+        ) AS usage
+        GROUP BY user_id, period_start
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_processed_files_user_id_processed_at', table_name='processed_files')
+    op.drop_table('usage_counters')
@@ -0,0 +1,197 @@
+# model_backends.py
+"""
+Backends for the text-correction step.
+
+A backend runs one chat completion and returns `(text, finish_reason, usage)`,
+where usage is (prompt tokens, completion tokens). Retries, batching and caching
+stay in process_docx; a backend only says which of its errors are worth
+retrying (`is_retryable`).
+
+Backends are chosen per plan with MODEL_BACKEND_FREE / MODEL_BACKEND_PRO (both
+default to MODEL_BACKEND). A spec is a backend name with an optional model,
+e.g. "openai", "openai:gpt-4o" or "echo":
+
+- openai: the OpenAI chat completions API.
+- echo: a local, rule-based stand-in that needs no network. It returns the
+  prompt's text with a few mechanical fixes applied (cut off at max_tokens),
+  after ECHO_LATENCY seconds (plus ECHO_LATENCY_PER_TOKEN per output token),
+  and fails a fraction ECHO_ERROR_RATE of requests with a retryable error.
+  Meant for load testing the whole upload path offline.
+"""
+
+import os
+import re
+import time
+import asyncio
+import random
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "openai:gpt-4o-mini")
+PLAN_BACKENDS = {
+    "free": os.getenv("MODEL_BACKEND_FREE", MODEL_BACKEND),
+    "pro": os.getenv("MODEL_BACKEND_PRO", MODEL_BACKEND),
+}
+
+DEFAULT_OPENAI_MODEL = "gpt-4o-mini"
+# Per-request timeout (seconds) for a single chat completion.
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+# A successful readiness check is trusted for this long (seconds).
+MODEL_CHECK_TTL = int(os.getenv("MODEL_CHECK_TTL", "60"))
+
+ECHO_LATENCY = float(os.getenv("ECHO_LATENCY", "0"))
+ECHO_LATENCY_PER_TOKEN = float(os.getenv("ECHO_LATENCY_PER_TOKEN", "0"))
+ECHO_ERROR_RATE = float(os.getenv("ECHO_ERROR_RATE", "0"))
+# Seed for the injected failures, so a benchmark run can be repeated exactly.
+ECHO_SEED = int(os.getenv("ECHO_SEED", "0"))
+
+
+class BackendUnavailable(Exception):
+    """A transient backend failure; the request may be retried."""
+
+
+class OpenAIBackend:
+    """Chat completions through the OpenAI API."""
+
+    def __init__(self, model=None):
+        self.model = model or DEFAULT_OPENAI_MODEL
+        # Cache keys made before backends were pluggable used the bare model name.
+        self.cache_id = self.model
+        self._client = None
+        self._checked_at = None
+
+    def get_client(self):
+        """
+        The AsyncOpenAI client, or None if it can't be configured (e.g. no API key).
+        Created on first use rather than at import, so a new worker can serve requests
+        without waiting on the network. Retries are ours (see process_docx._complete),
+        so backoff is bounded by our own settings.
+        """
+        if self._client is None:
+            # Imported here: the openai package alone takes about half a second to import.
+            from openai import AsyncOpenAI
+            try:
+                self._client = AsyncOpenAI(max_retries=0, timeout=OPENAI_TIMEOUT)
+            except Exception as e:
+                print(f"Error: Could not initialize OpenAI client. Check your API key. Details: {e}")
+                return None
+        return self._client
+
+    def ensure_configured(self):
+        if self.get_client() is None:
+            raise ConnectionError("OpenAI service is not configured on the server.")
+
+    async def check(self):
+        """List models; raises on failure. A success is cached for MODEL_CHECK_TTL seconds."""
+        if self._checked_at is not None and time.monotonic() - self._checked_at < MODEL_CHECK_TTL:
+            return
+        self.ensure_configured()
+        await self._client.models.list(timeout=OPENAI_TIMEOUT)
+        self._checked_at = time.monotonic()
+
+    async def complete(self, messages, max_tokens, temperature):
+        resp = await self.get_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout=OPENAI_TIMEOUT,
+        )
+        choice = resp.choices[0]
+        usage = (resp.usage.prompt_tokens, resp.usage.completion_tokens) if resp.usage else (0, 0)
+        return choice.message.content, choice.finish_reason, usage
+
+    def is_retryable(self, exc):
+        """Rate limits, server errors, timeouts and dropped connections are worth another try."""
+        import openai
+
+        if isinstance(exc, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+            return True
+        if isinstance(exc, openai.APIStatusError):
+            return exc.status_code >= 500
+        return False
+
+
+# Mechanical fixes applied by the echo backend. None of them touch a [[Pn]] marker line.
+_ECHO_RULES = [
+    (re.compile(r"[ \t]{2,}"), " "),
+    (re.compile(r"[ \t]+([,.;:!?])"), r"\1"),
+    (re.compile(r"(?<=\s)i(?=\s)"), "I"),
+    (re.compile(r"[ \t]+$", re.MULTILINE), ""),
+]
+
+
+class EchoBackend:
+    """Local, deterministic stand-in: echoes the prompt's text with simple rule-based fixes."""
+
+    def __init__(self, model=None, latency=None, latency_per_token=None, error_rate=None, seed=None):
+        self.model = model or "echo"
+        self.cache_id = "echo" if self.model == "echo" else f"echo:{self.model}"
+        self.latency = ECHO_LATENCY if latency is None else latency
+        self.latency_per_token = ECHO_LATENCY_PER_TOKEN if latency_per_token is None else latency_per_token
+        self.error_rate = ECHO_ERROR_RATE if error_rate is None else error_rate
+        self._random = random.Random(ECHO_SEED if seed is None else seed)
+        # Counters for benchmarks.
+        self.requests = 0
+        self.failures = 0
+        self.truncated = 0
+
+    def ensure_configured(self):
+        pass
+
+    async def check(self):
+        pass
+
+    async def complete(self, messages, max_tokens, temperature):
+        self.requests += 1
+        prompt = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        # The text to fix follows the instructions, after the first blank line.
+        instructions, separator, text = prompt.partition("\n\n")
+        if not separator:
+            text = instructions
+        for pattern, replacement in _ECHO_RULES:
+            text = pattern.sub(replacement, text)
+
+        # Like a real model, stop at max_tokens (~4 characters per token).
+        finish_reason = "stop"
+        if len(text) // 4 + 1 > max_tokens:
+            text = text[:max_tokens * 4]
+            finish_reason = "length"
+
+        delay = self.latency + self.latency_per_token * (len(text) // 4 + 1)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.failures += 1
+            raise BackendUnavailable("injected failure")
+        if finish_reason == "length":
+            self.truncated += 1
+        # Estimated like process_docx.estimate_tokens.
+        usage = (sum(len(m["content"]) for m in messages) // 4 + 1, len(text) // 4 + 1)
+        return text, finish_reason, usage
+
+    def is_retryable(self, exc):
+        return isinstance(exc, BackendUnavailable)
+
+
+BACKENDS = {"openai": OpenAIBackend, "echo": EchoBackend}
+
+_instances = {}
+
+
+def get_backend(plan=None):
+    """The backend for `plan`, shared by every request on that route (unknown plans use MODEL_BACKEND)."""
+    spec = PLAN_BACKENDS.get(plan, MODEL_BACKEND)
+    if spec not in _instances:
+        name, _, model = spec.partition(":")
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown model backend {name!r} (expected one of: {', '.join(BACKENDS)})")
+        _instances[spec] = BACKENDS[name](model or None)
+    return _instances[spec]
+
+
+async def check_backends():
+    """Readiness check for every configured backend; raises on the first failure."""
+    for plan in PLAN_BACKENDS:
+        await get_backend(plan).check()
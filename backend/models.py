@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, LargeBinary, Index
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from database import Base
 
@@ -33,4 +33,92 @@ class ProcessedFile(Base):
     ip_address = Column(String)
 
     # This links a processed file back to its owner (a user).
-    owner = relationship("User", back_populates="processed_files")
\ No newline at end of file
+    owner = relationship("User", back_populates="processed_files")
+
+    # Per-user history queries ("what did I process this month").
+    __table_args__ = (
+        Index("ix_processed_files_user_id_processed_at", "user_id", "processed_at"),
+    )
+
+
+class UsageCounter(Base):
+    """
+    Documents a user has used or reserved in one billing period (see usage.py).
+    Quota checks read and increment this single row instead of counting processed_files.
+    """
+    __tablename__ = "usage_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    # First day of the billing period (calendar month, UTC), or usage.LIFETIME on the free plan.
+    period_start = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class CachedParagraph(Base):
+    """
+    Persistent tier of the paragraph result cache (see paragraph_cache.py).
+    Keyed by a hash of the paragraph text and the model settings that produced the fix.
+    """
+    __tablename__ = "paragraph_cache"
+
+    key = Column(String(64), primary_key=True)
+    fixed_text = Column(Text, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class DocumentParagraph(Base):
+    """
+    One paragraph of a document a user has had fixed, by content hash, with the
+    correction it got (see document_history.py). A re-uploaded version of the
+    document reuses the corrections of the paragraphs it shares with this one.
+    """
+    __tablename__ = "document_paragraphs"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Groups the paragraphs of one processed document.
+    document_id = Column(String(36), nullable=False)
+    position = Column(Integer, nullable=False)
+    text_hash = Column(String(32), nullable=False)
+    # NULL when the model left the paragraph unchanged.
+    fixed_text = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    __table_args__ = (
+        # Finding a user's earlier documents that share paragraphs with a new upload.
+        Index("ix_document_paragraphs_user_id_text_hash", "user_id", "text_hash"),
+        # Loading one document's paragraphs in order.
+        Index("ix_document_paragraphs_document_id_position", "document_id", "position"),
+    )
+
+
+
+class Job(Base):
+    """
+    A queued document fix, processed by a background worker (see worker.py).
+    The upload and the fixed document are stored inline and only loaded on demand.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    file_name = Column(String, nullable=False)
+    ip_address = Column(String)
+    # queued -> running -> done | failed
+    status = Column(String(20), nullable=False, default="queued", index=True)
+    paragraphs_done = Column(Integer, nullable=False, default=0)
+    paragraphs_total = Column(Integer, nullable=False, default=0)
+    # Paragraphs passed through without a model call (see paragraph_filter).
+    paragraphs_skipped = Column(Integer, nullable=False, default=0, server_default="0")
+    # Paragraphs whose correction was reused from an earlier version (see document_history).
+    paragraphs_reused = Column(Integer, nullable=False, default=0, server_default="0")
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    input_data = deferred(Column(LargeBinary, nullable=True))
+    result_data = deferred(Column(LargeBinary, nullable=True))
+
+    owner = relationship("User")
@@ -0,0 +1,200 @@
+# paragraph_cache.py
+"""
+Content-addressed cache of fixed paragraphs.
+
+Keys are a SHA-256 of (normalized paragraph text, system prompt, model, temperature),
+so a re-uploaded document only sends new or changed paragraphs to the model.
+There are two tiers:
+  - an in-process LRU bounded by entry count and total UTF-8 size of the text, and
+  - a persistent tier in the main database (`paragraph_cache` table) shared by all workers.
+Both tiers honour the same TTL.
+"""
+
+import os
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import SessionLocal
+import models
+
+CACHE_MAX_ENTRIES = int(os.getenv("PARAGRAPH_CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.getenv("PARAGRAPH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL_SECONDS = int(os.getenv("PARAGRAPH_CACHE_TTL", str(30 * 24 * 3600)))
+CACHE_PERSISTENT = os.getenv("PARAGRAPH_CACHE_PERSISTENT", "true").lower() == "true"
+# Expired rows are purged from the persistent tier at most this often (seconds).
+CACHE_PURGE_INTERVAL = int(os.getenv("PARAGRAPH_CACHE_PURGE_INTERVAL", "600"))
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially re-spaced paragraphs share a cache entry."""
+    return " ".join(text.split())
+
+
+def make_cache_key(text, system_prompt, model, temperature):
+    """Hash everything that influences the model output for one paragraph."""
+    h = hashlib.sha256()
+    for part in (normalize_text(text), system_prompt, model, repr(temperature)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ParagraphCache:
+    """Two-tier (memory LRU + database) cache of fixed paragraph text. Thread-safe."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES,
+                 ttl_seconds=CACHE_TTL_SECONDS, persistent=CACHE_PERSISTENT):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self._lru = OrderedDict()  # key -> (fixed_text, expires_at epoch seconds, UTF-8 size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # --- Memory tier ---
+    def _memory_get(self, key, now):
+        entry = self._lru.get(key)
+        if entry is None:
+            return None
+        value, expires_at, _ = entry
+        if expires_at <= now:
+            self._memory_remove(key)
+            return None
+        self._lru.move_to_end(key)
+        return value
+
+    def _memory_remove(self, key):
+        _, _, size = self._lru.pop(key)
+        self._bytes -= size
+
+    def _memory_put(self, key, value, expires_at):
+        if key in self._lru:
+            self._memory_remove(key)
+        size = len(value.encode("utf-8"))
+        self._lru[key] = (value, expires_at, size)
+        self._bytes += size
+        while self._lru and (len(self._lru) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._lru))
+            self._memory_remove(oldest)
+            self.evictions += 1
+
+    # --- Persistent tier ---
+    def _db_get_many(self, keys):
+        now = datetime.now(timezone.utc)
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(models.CachedParagraph)
+                .filter(models.CachedParagraph.key.in_(keys), models.CachedParagraph.expires_at > now)
+                .all()
+            )
+            return {row.key: (row.fixed_text, row.expires_at) for row in rows}
+        finally:
+            db.close()
+
+    def _db_put_many(self, entries, expires_at):
+        db = SessionLocal()
+        try:
+            db.query(models.CachedParagraph).filter(
+                models.CachedParagraph.key.in_(list(entries))
+            ).delete(synchronize_session=False)
+            db.add_all(
+                models.CachedParagraph(key=key, fixed_text=value, expires_at=expires_at)
+                for key, value in entries.items()
+            )
+            if time.time() - self._last_purge > CACHE_PURGE_INTERVAL:
+                self._last_purge = time.time()
+                db.query(models.CachedParagraph).filter(
+                    models.CachedParagraph.expires_at <= datetime.now(timezone.utc)
+                ).delete(synchronize_session=False)
+            db.commit()
+        except SQLAlchemyError as e:
+            # Another worker may have written the same keys concurrently; the cache is best-effort.
+            db.rollback()
+            print(f"Paragraph cache write skipped: {e}")
+        finally:
+            db.close()
+
+    # --- Public API ---
+    def get_many(self, keys):
+        """Return {key: fixed_text} for every key found in either tier."""
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._memory_get(key, now)
+                if value is not None:
+                    found[key] = value
+            self.memory_hits += len(found)
+
+        remaining = [key for key in keys if key not in found]
+        rows = {}
+        if remaining and self.persistent:
+            try:
+                rows = self._db_get_many(remaining)
+            except SQLAlchemyError as e:
+                print(f"Paragraph cache read skipped: {e}")
+
+        with self._lock:
+            for key, (value, expires_at) in rows.items():
+                if expires_at.tzinfo is None:
+                    # SQLite hands back naive datetimes; everything we store is UTC.
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
+                self._memory_put(key, value, expires_at.timestamp())
+                found[key] = value
+            self.persistent_hits += len(rows)
+            self.misses += len(remaining) - len(rows)
+        return found
+
+    def put_many(self, entries):
+        """Store {key: fixed_text} in both tiers."""
+        if not entries:
+            return
+        expires = time.time() + self.ttl_seconds
+        with self._lock:
+            for key, value in entries.items():
+                self._memory_put(key, value, expires)
+        if self.persistent:
+            self._db_put_many(entries, datetime.fromtimestamp(expires, timezone.utc))
+
+    def clear(self):
+        """Drop the in-memory tier and reset counters (the persistent tier is left alone)."""
+        with self._lock:
+            self._lru.clear()
+            self._bytes = 0
+            self.memory_hits = self.persistent_hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.persistent_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._lru),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self.persistent,
+            }
+
+
+# Shared, process-wide cache instance.
+paragraph_cache = ParagraphCache()
@@ -0,0 +1,118 @@
+# paragraph_filter.py
+"""
+Decide, per paragraph, whether it needs a model call at all.
+
+Headings, page numbers, dates, signatures, URLs, code and bullet labels gain
+nothing from the model but cost a request each. `skip_reason` returns why a
+paragraph can be passed through unchanged, or None if it should be fixed:
+
+  - "style":     Title / Subtitle / Heading / TOC paragraphs, and short list items
+  - "short":     fewer than PARAGRAPH_MIN_WORDS words (in scripts written without
+                 spaces, such as Chinese, Japanese or Thai, every two characters count as a word)
+  - "non_prose": numbers, dates, URLs, e-mail addresses, code, or mostly non-letters
+  - "clean":     passes a spelling and punctuation pre-check (only with
+                 PARAGRAPH_SPELLCHECK=true, which needs the `pyspellchecker` package)
+
+Pure functions with no I/O, so this runs in the document CPU pool alongside parsing.
+Set PARAGRAPH_FILTER=false to send every paragraph to the model.
+"""
+
+import os
+import re
+
+PARAGRAPH_FILTER = os.getenv("PARAGRAPH_FILTER", "true").lower() == "true"
+PARAGRAPH_MIN_WORDS = int(os.getenv("PARAGRAPH_MIN_WORDS", "3"))
+# List items shorter than this are treated as labels; longer ones are prose (e.g. resume bullets).
+PARAGRAPH_LIST_MIN_WORDS = int(os.getenv("PARAGRAPH_LIST_MIN_WORDS", "6"))
+PARAGRAPH_SPELLCHECK = os.getenv("PARAGRAPH_SPELLCHECK", "false").lower() == "true"
+
+# Style ids (not display names) of paragraphs that are never sent.
+SKIP_STYLE_PREFIXES = ("Title", "Subtitle", "Heading", "TOC")
+LIST_STYLE_PREFIXES = ("List",)
+
+_WORD_RE = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
+# Letters of scripts written without spaces between words: Thai, Lao, Myanmar, Khmer,
+# Japanese kana and CJK ideographs. A whole clause of them is one _WORD_RE match.
+_UNSPACED_RE = re.compile(
+    "[\u0e00-\u0eff\u1000-\u109f\u1780-\u17ff\u3040-\u30ff\u31f0-\u31ff"
+    "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff66-\uff9f\U00020000-\U0002fa1f]"
+)
+_UNSPACED_CHARS_PER_WORD = 2
+_NON_PROSE_RE = re.compile(
+    r"""^(?:
+        (?:https?://|www\.)\S+                              # a URL
+      | [\w.+-]+@[\w-]+(?:\.[\w-]+)+                         # an e-mail address
+      | (?:page\s+)?\d+(?:\s*(?:of|/)\s*\d+)?                # a page number
+      | [\d\s.,:;/()+%$€£#*-]+                               # numbers, dates, phone numbers, amounts
+      | (?:[•·▪◦‣–—-]|\(?[0-9a-zA-Z]{1,3}[.)])               # a bare bullet or list label
+    )$""",
+    re.IGNORECASE | re.VERBOSE,
+)
+_CODE_RE = re.compile(
+    r"[{}]\s*$|=>|==|!="
+    r"|\b[A-Za-z_]\w*\([^()]*\)\s*[:;{]?\s*$"      # ends with a call: print(x);
+    r"|^\s*(?:def|class)\s+\w+.*:\s*$"
+    r"|^\s*(?:#include|import\s+[\w.]+\s*$)"
+)
+# Signs a paragraph needs editing even if every word is spelled right.
+_SUSPECT_RE = re.compile(
+    r"[ \t]{2}"                  # double spaces
+    r"|\s[,.;:!?]"               # space before punctuation
+    r"|[,;:][^\s\d\"'”’)]"       # no space after punctuation
+    r"|(?<=\s)i(?=\s)"           # lower-case "i"
+    r"|\b(\w+)\s+\1\b"           # a repeated word
+    r"|[.!?]\s+[a-z]"            # a sentence starting in lower case
+)
+
+_spell = None
+
+
+def _spellchecker():
+    global _spell
+    if _spell is None:
+        try:
+            from spellchecker import SpellChecker
+        except ImportError as e:
+            raise RuntimeError("PARAGRAPH_SPELLCHECK=true requires the 'pyspellchecker' package.") from e
+        _spell = SpellChecker()
+    return _spell
+
+
+def _looks_clean(text, words):
+    """Spelling and punctuation pre-check: True if there is nothing obvious for the model to fix."""
+    if not (text[0].isupper() or text[0].isdigit()) or text[-1] not in ".!?:)\"”'’":
+        return False
+    if _SUSPECT_RE.search(text):
+        return False
+    # Capitalized words are usually names; the dictionary doesn't know most of them.
+    candidates = [w for w in words if not w[0].isupper()]
+    return not _spellchecker().unknown(candidates)
+
+
+def _word_count(words):
+    """Words for the length checks, counting unspaced scripts by their characters."""
+    unspaced = sum(len(_UNSPACED_RE.findall(w)) for w in words)
+    spaced = sum(1 for w in words if not _UNSPACED_RE.search(w))
+    return spaced + -(-unspaced // _UNSPACED_CHARS_PER_WORD)
+
+
+def skip_reason(text, style=None):
+    """Why `text` (a stripped, non-empty paragraph with style id `style`) needs no model call, or None."""
+    if not PARAGRAPH_FILTER:
+        return None
+    words = _WORD_RE.findall(text)
+    if style:
+        if style.startswith(SKIP_STYLE_PREFIXES):
+            return "style"
+        if style.startswith(LIST_STYLE_PREFIXES) and _word_count(words) < PARAGRAPH_LIST_MIN_WORDS:
+            return "style"
+    if _NON_PROSE_RE.match(text) or _CODE_RE.search(text):
+        return "non_prose"
+    letters = sum(len(w) for w in words)
+    if letters < len(text.replace(" ", "")) / 2:
+        return "non_prose"
+    if _word_count(words) < PARAGRAPH_MIN_WORDS:
+        return "short"
+    if PARAGRAPH_SPELLCHECK and _looks_clean(text, words):
+        return "clean"
+    return None
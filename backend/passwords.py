@@ -0,0 +1,68 @@
+# passwords.py
+"""
+Password hashing off the event loop.
+
+A bcrypt hash or check costs ~200 ms of CPU at the default work factor. Run on
+the event loop, a burst of logins stalls every other request, so the work runs
+in a small thread pool instead (bcrypt releases the GIL while hashing).
+
+At most PASSWORD_HASH_MAX_PENDING operations may be queued or running; past
+that, `PasswordHasherBusy` is raised and the API answers 503 rather than letting
+the queue (and every caller's latency) grow without bound.
+
+Stored hashes with a different work factor than BCRYPT_ROUNDS are re-hashed on
+the next successful login (see `verify_and_update`).
+"""
+
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# 0 hashes inline on the event loop (the old behaviour).
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+# Hashes with other rounds count as deprecated, so verify_and_update upgrades them.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_executor = None
+_pending = 0
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password operations are already queued."""
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+
+async def _run(fn, *args):
+    global _pending
+    if PASSWORD_HASH_WORKERS <= 0:
+        return fn(*args)
+    if _pending >= PASSWORD_HASH_MAX_PENDING:
+        raise PasswordHasherBusy()
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password):
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_and_update(password, hashed_password):
+    """
+    Check `password` against `hashed_password`. Returns (valid, new_hash), where
+    new_hash is a replacement hash to store if the old one is out of date, else None.
+    """
+    return await _run(pwd_context.verify_and_update, password, hashed_password)
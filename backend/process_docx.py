@@ -1,94 +1,666 @@
 # process_docx.py
 
 import os
-import tempfile
+import io
+import asyncio
+import random
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import posixpath
 from dotenv import load_dotenv
-from docx import Document
-from docx.shared import Pt, Inches
-from openai import OpenAI # <-- Import the new client
+
+from paragraph_cache import paragraph_cache, make_cache_key
+from docx_pipeline import extract_paragraphs, apply_corrections
+from model_backends import get_backend
+from scheduler import model_scheduler, plan_weight
+import document_history
+from document_history import paragraph_hash
+import metrics
 
 # Load environment variables from .env file for local development
 load_dotenv()
 
-# --- Initialize the OpenAI Client ---
-# The client automatically looks for the OPENAI_API_KEY environment variable.
-# This is the modern and recommended way.
-try:
-    client = OpenAI()
-    # Test the connection by listing models (optional, but good for debugging)
-    client.models.list() 
-    print("Successfully connected to OpenAI.")
-except Exception as e:
-    print(f"Error: Could not initialize OpenAI client. Check your API key. Details: {e}")
-    client = None
-
-async def fix_document(file):
-    """Fix grammar, clarity & formatting in a .docx upload using the modern OpenAI client."""
-    
-    # Check if the client was initialized successfully
-    if not client:
-        # If the client failed to init, we can't process the document.
-        # This will raise an error that the user's request will see.
-        raise ConnectionError("OpenAI service is not configured on the server.")
-
-    # 1) Read and dump to temp file
-    contents = await file.read()
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
-        tmp.write(contents)
-        tmp_path = tmp.name
-
-    # 2) Load doc
-    doc = Document(tmp_path)
-    print(f"Loaded {len(doc.paragraphs)} paragraphs…")
-
-    # 3) AI system prompt - UPDATED
-    system_msg = """You are SmartDocFixer AI, an expert editor. You improve grammar, clarity, and professional formatting. 
+# --- Model call tuning ---
+# How many paragraph requests may be in flight at once for a single document
+# (requests also need a slot of the process-wide MODEL_CONCURRENCY, see scheduler.py).
+FIX_CONCURRENCY = int(os.getenv("FIX_CONCURRENCY", "8"))
+# Retries on 429/5xx/timeouts, with exponential backoff starting at OPENAI_BACKOFF seconds.
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_BACKOFF = float(os.getenv("OPENAI_BACKOFF", "0.5"))
+
+# Consecutive short paragraphs are packed into one request up to this many
+# (estimated) prompt tokens and paragraphs. Set BATCH_TOKEN_BUDGET=0 to send
+# every paragraph on its own.
+BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", "800"))
+BATCH_MAX_PARAGRAPHS = int(os.getenv("BATCH_MAX_PARAGRAPHS", "20"))
+
+# Paragraphs over this many (estimated) tokens are split at sentence boundaries and
+# fixed piece by piece, so no response is cut off at MAX_TOKENS. 0 never splits them.
+SEGMENT_TOKEN_BUDGET = int(os.getenv("SEGMENT_TOKEN_BUDGET", "500"))
+# Send this many neighbouring paragraphs (or pieces) on each side as read-only
+# context, at most CONTEXT_TOKEN_BUDGET tokens per side. 0 sends no context.
+CONTEXT_PARAGRAPHS = int(os.getenv("CONTEXT_PARAGRAPHS", "0"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "150"))
+# A document is fixed in windows of this many paragraphs (pieces): the cache lookups,
+# requests and cache writes of one window finish before the next starts, so in-flight
+# work stays bounded however long the document is. 0 fixes it in one window.
+FIX_WINDOW_SIZE = int(os.getenv("FIX_WINDOW_SIZE", "1000"))
+
+# --- Document CPU pool ---
+# Parsing and saving .docx files is CPU-bound, so it runs in a process pool to keep
+# the event loop free. DOC_POOL_SIZE=0 runs it inline on the calling thread instead.
+DOC_POOL_SIZE = int(os.getenv("DOC_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+# Address-space limit per pool process (MB, 0 = unlimited); a document that needs
+# more fails with MemoryError instead of taking the server down.
+DOC_POOL_MEMORY_MB = int(os.getenv("DOC_POOL_MEMORY_MB", "1024"))
+# Recycle the pool after this many tasks per process to return memory to the OS.
+DOC_POOL_MAX_TASKS = int(os.getenv("DOC_POOL_MAX_TASKS", "50"))
+
+# --- Upload limits ---
+# Largest .docx accepted, and limits on what its zip central directory may declare.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "20")) * 1024 * 1024
+MAX_UNCOMPRESSED_BYTES = int(os.getenv("MAX_UNCOMPRESSED_MB", "200")) * 1024 * 1024
+MAX_COMPRESSION_RATIO = int(os.getenv("MAX_COMPRESSION_RATIO", "100"))
+MAX_ZIP_ENTRIES = int(os.getenv("MAX_ZIP_ENTRIES", "2000"))
+# Bulk uploads: documents per batch, and the total size of the uploads (and of the
+# .docx files they unpack to).
+BULK_MAX_DOCUMENTS = int(os.getenv("BULK_MAX_DOCUMENTS", "50"))
+MAX_BULK_UPLOAD_BYTES = int(os.getenv("MAX_BULK_UPLOAD_MB", "100")) * 1024 * 1024
+
+MAX_TOKENS = 1024
+TEMPERATURE = 0.2
+
+# AI system prompt
+SYSTEM_MSG = """You are SmartDocFixer AI, an expert editor. You improve grammar, clarity, and professional formatting.
     Preserve essential structures like headings, lists, and tables. Your goal is to polish the text, not remove its core components.
     Do not add any conversational text or apologies like "Here is the fixed paragraph:".
     IMPORTANT: Your output must be plain text only. Do not use any Markdown formatting like **bold** or # headings. Just return the corrected text directly."""
 
-    # 4) Iterate through paragraphs and fix them
-    for i, para in enumerate(doc.paragraphs):
-        text = para.text.strip()
-        if not text:
+BATCH_INSTRUCTIONS = """Correct and improve each of the following paragraphs independently.
+Each paragraph starts with a marker line like [[P1]]. Return every paragraph, in the same order,
+each preceded by its original marker line. Do not merge, split, drop or renumber paragraphs."""
+
+CONTEXT_INSTRUCTIONS = """The text around the paragraphs you are correcting is given below for context only,
+so terminology, tense and tone stay consistent. Do not correct it or include it in your answer."""
+
+_MARKER_RE = re.compile(r"^[ \t]*\[\[P(\d+)\]\][ \t]*$", re.MULTILINE)
+# The end of a sentence: terminal punctuation, closing quotes/brackets, then whitespace.
+_SENTENCE_END_RE = re.compile(r"[.!?…]+[\"'”’)\]]*\s+")
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def split_sentences(text):
+    """Split `text` after each sentence end; the pieces (with their trailing whitespace) join back to `text`."""
+    pieces, start = [], 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        pieces.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        pieces.append(text[start:])
+    return pieces
+
+
+def segment_paragraph(text, token_budget=None):
+    """
+    Split `text` into pieces of at most `token_budget` estimated tokens, at sentence
+    boundaries where possible and between words otherwise. Returns [(piece, separator)];
+    joining each piece with its separator gives back `text` exactly. A budget of 0
+    leaves `text` whole.
+    """
+    token_budget = SEGMENT_TOKEN_BUDGET if token_budget is None else token_budget
+    if token_budget <= 0 or estimate_tokens(text) <= token_budget:
+        return [(text, "")]
+    pieces = []
+    for sentence in split_sentences(text):
+        if estimate_tokens(sentence) > token_budget:
+            pieces.extend(re.findall(r"\S+\s*", sentence))
+        else:
+            pieces.append(sentence)
+
+    segments, current = [], ""
+    for piece in pieces:
+        if current and estimate_tokens(current + piece) > token_budget:
+            segments.append(current)
+            current = ""
+        current += piece
+    if current:
+        segments.append(current)
+    return [(segment.rstrip(), segment[len(segment.rstrip()):]) for segment in segments]
+
+
+def pack_paragraphs(texts, token_budget=None, max_paragraphs=None):
+    """
+    Group consecutive paragraph indices into batches whose estimated prompt size
+    stays within `token_budget`. A paragraph larger than the budget gets a batch of its own.
+    """
+    token_budget = BATCH_TOKEN_BUDGET if token_budget is None else token_budget
+    max_paragraphs = max_paragraphs or BATCH_MAX_PARAGRAPHS
+    batches, current, current_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        # The marker line costs a few tokens on top of the text itself.
+        tokens = estimate_tokens(text) + 4
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_paragraphs):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def build_batch_prompt(texts):
+    """Join paragraphs into one prompt, each preceded by its [[Pn]] marker line."""
+    body = "\n\n".join(f"[[P{n}]]\n{text}" for n, text in enumerate(texts, start=1))
+    return f"{BATCH_INSTRUCTIONS}\n\n{body}"
+
+
+def split_batch_response(content, expected):
+    """
+    Split a batched response back into paragraphs. Returns None when the markers
+    are missing, out of order, or the paragraph count doesn't match.
+    """
+    parts = _MARKER_RE.split(content)
+    # parts = [preamble, "1", text1, "2", text2, ...]
+    if parts[0].strip():
+        return None
+    numbers = [int(n) for n in parts[1::2]]
+    texts = [t.strip() for t in parts[2::2]]
+    if numbers != list(range(1, expected + 1)) or not all(texts):
+        return None
+    return texts
+
+
+_doc_pool = None
+_doc_pool_tasks = 0
+
+
+def _limit_memory(limit_mb):
+    """Pool process initializer: cap the address space of this process."""
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows; run without a limit.
+        return
+    if limit_mb:
+        limit = limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _get_doc_pool():
+    global _doc_pool, _doc_pool_tasks
+    if _doc_pool is not None and DOC_POOL_MAX_TASKS and _doc_pool_tasks >= DOC_POOL_MAX_TASKS * DOC_POOL_SIZE:
+        # Replace the whole pool rather than using max_tasks_per_child, which can hang
+        # on Python 3.11 when a process retires while tasks are queued. The old pool
+        # finishes the tasks it already has and then exits.
+        _doc_pool.shutdown(wait=False)
+        _doc_pool = None
+    if _doc_pool is None:
+        _doc_pool = ProcessPoolExecutor(
+            max_workers=DOC_POOL_SIZE,
+            # Spawned, not forked: the parent runs an event loop and helper threads.
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_limit_memory,
+            initargs=(DOC_POOL_MEMORY_MB,),
+        )
+        _doc_pool_tasks = 0
+    _doc_pool_tasks += 1
+    return _doc_pool
+
+
+def shutdown_doc_pool():
+    """
+    Stop the pool's processes. Needed in multiprocessing children, which join their
+    own children at exit before the executor's atexit hook would shut it down.
+    """
+    global _doc_pool
+    if _doc_pool is not None:
+        _doc_pool.shutdown()
+        _doc_pool = None
+
+
+async def run_cpu(fn, *args):
+    """Run a CPU-bound document function in the process pool (or inline if disabled)."""
+    global _doc_pool
+    if DOC_POOL_SIZE <= 0:
+        return fn(*args)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_doc_pool(), fn, *args)
+    except BrokenProcessPool:
+        # A pool process died (e.g. killed for memory); start a fresh pool next time.
+        _doc_pool = None
+        raise
+
+
+class DocumentTooLargeError(ValueError):
+    """The upload, or what it would decompress to, is over our limits."""
+
+
+def check_docx_archive(contents):
+    """
+    Inspect the zip central directory of a .docx before handing it to python-docx.
+    Raises ValueError if it isn't a zip, and DocumentTooLargeError if it declares
+    more entries, more uncompressed data, or a higher compression ratio than we allow.
+    zipfile never inflates an entry past its declared size, so these limits hold
+    for the actual parse too.
+    """
+    try:
+        infos = zipfile.ZipFile(io.BytesIO(contents)).infolist()
+    except zipfile.BadZipFile:
+        raise ValueError("The file is not a valid .docx document.")
+
+    if len(infos) > MAX_ZIP_ENTRIES:
+        raise DocumentTooLargeError("The document contains too many parts.")
+    total = sum(info.file_size for info in infos)
+    if total > MAX_UNCOMPRESSED_BYTES:
+        raise DocumentTooLargeError("The document is too large once decompressed.")
+    for info in infos:
+        if info.file_size > 1024 * 1024 and info.file_size > MAX_COMPRESSION_RATIO * max(info.compress_size, 1):
+            raise DocumentTooLargeError("The document is compressed suspiciously well and was rejected.")
+
+
+def docx_files_in_zip(contents, max_documents=None, max_bytes=None):
+    """
+    The .docx files in an uploaded .zip, as [(name, bytes or an error message)].
+    Other entries (folders, macOS metadata, Word lock files) are ignored. Raises
+    ValueError if it isn't a zip, and DocumentTooLargeError if it holds more than
+    `max_documents` (BULK_MAX_DOCUMENTS) documents or they declare more than
+    `max_bytes` (MAX_BULK_UPLOAD_BYTES) in total; a single document over
+    MAX_UPLOAD_BYTES is reported and not inflated.
+    """
+    max_documents = BULK_MAX_DOCUMENTS if max_documents is None else max_documents
+    max_bytes = MAX_BULK_UPLOAD_BYTES if max_bytes is None else max_bytes
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(contents))
+        infos = archive.infolist()
+    except zipfile.BadZipFile:
+        raise ValueError("The file is not a valid .zip archive.")
+
+    infos = [
+        info for info in infos
+        if not info.is_dir() and info.filename.lower().endswith(".docx")
+        and not info.filename.startswith("__MACOSX/") and not posixpath.basename(info.filename).startswith("~$")
+    ]
+    if len(infos) > max_documents:
+        raise DocumentTooLargeError(f"A batch can hold at most {BULK_MAX_DOCUMENTS} documents.")
+    if sum(info.file_size for info in infos if info.file_size <= MAX_UPLOAD_BYTES) > max_bytes:
+        raise DocumentTooLargeError("The documents in the batch are too large in total once unpacked.")
+
+    files = []
+    for info in infos:
+        if info.file_size > MAX_UPLOAD_BYTES:
+            files.append((info.filename, f"Files larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB are not supported."))
             continue
+        try:
+            files.append((info.filename, archive.read(info)))
+        except Exception:
+            # Encrypted, corrupt, or an unsupported compression method.
+            files.append((info.filename, "The file could not be extracted from the archive."))
+    return files
+
 
-        # Call OpenAI using the new client.chat.completions.create method
+async def _complete(backend, messages, max_tokens=MAX_TOKENS):
+    """
+    Run one chat completion on `backend`, retrying transient failures with exponential
+    backoff and jitter. Returns (text, finish_reason).
+    """
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        start = time.perf_counter()
         try:
-            # Note the new syntax here
-            resp = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_msg},
-                    {"role": "user",   "content": f"Correct and improve the following paragraph:\n\n{text}"}
-                ],
-                max_tokens=1024,
-                temperature=0.2,
+            text, finish_reason, (prompt_tokens, completion_tokens) = await backend.complete(
+                messages, max_tokens, TEMPERATURE
             )
-            improved = resp.choices[0].message.content.strip()
         except Exception as e:
-            # If the API call fails for any reason, log it and fall back to original text
-            print(f"OpenAI API error on paragraph {i}:", e)
-            improved = text  # Fallback to the original text
-
-        # 5) Replace paragraph text
-        para.text = improved
-
-        # 6) Re-apply basic font formatting to ensure consistency
-        for run in para.runs:
-            run.font.name = "Calibri"
-            run.font.size = Pt(11)
-
-    # 7) Set global document formatting
-    for section in doc.sections:
-        section.top_margin = Inches(1)
-        section.bottom_margin = Inches(1)
-        section.left_margin = Inches(1)
-        section.right_margin = Inches(1)
-
-    # 8) Save to a new file and clean up the temp file
-    out_path = tmp_path.replace(".docx", "_fixed.docx")
-    doc.save(out_path)
-    os.unlink(tmp_path)
-    print("Saved fixed document to:", out_path)
-    return out_path
+            metrics.MODEL_LATENCY.labels(backend.cache_id, "error").observe(time.perf_counter() - start)
+            if attempt == OPENAI_MAX_RETRIES or not backend.is_retryable(e):
+                raise
+            metrics.MODEL_RETRIES.labels(backend.cache_id).inc()
+            delay = OPENAI_BACKOFF * (2 ** attempt)
+            await asyncio.sleep(delay + random.uniform(0, delay))
+            continue
+        outcome = "truncated" if finish_reason == "length" else "ok"
+        metrics.MODEL_LATENCY.labels(backend.cache_id, outcome).observe(time.perf_counter() - start)
+        metrics.MODEL_TOKENS.labels(backend.cache_id, "prompt").inc(prompt_tokens)
+        metrics.MODEL_TOKENS.labels(backend.cache_id, "completion").inc(completion_tokens)
+        return text, finish_reason
+
+
+class _RequestSlots:
+    """A document's own concurrency limit, then a fair share of the process-wide model capacity."""
+
+    def __init__(self, concurrency, flow, weight):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._flow = flow
+        self._weight = weight
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        try:
+            await model_scheduler.acquire(self._flow, self._weight)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    async def __aexit__(self, *exc_info):
+        model_scheduler.release()
+        self._semaphore.release()
+
+
+def _messages(prompt, context=None):
+    messages = [{"role": "system", "content": SYSTEM_MSG}]
+    if context:
+        messages.append({"role": "system", "content": f"{CONTEXT_INSTRUCTIONS}\n\n{context}"})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+async def _fix_paragraph(backend, index, text, slots, context=None):
+    async with slots:
+        try:
+            content, finish_reason = await _complete(backend, _messages(
+                f"Correct and improve the following paragraph:\n\n{text}", context
+            ))
+        except Exception as e:
+            # If the API call fails for any reason, log it; the caller falls back to the original text
+            print(f"Model error on paragraph {index}:", e)
+            metrics.MODEL_FALLBACKS.labels("error").inc()
+            return None
+    if finish_reason == "length":
+        # A cut-off answer would silently drop the end of the paragraph.
+        print(f"Response for paragraph {index} was truncated, keeping the original.")
+        metrics.MODEL_FALLBACKS.labels("truncated").inc()
+        return None
+    if not content or not content.strip():
+        # A refusal or a content-filter stop comes back without text; writing (and
+        # caching) an empty answer would erase the paragraph.
+        print(f"No text for paragraph {index} (finish reason {finish_reason}), keeping the original.")
+        metrics.MODEL_FALLBACKS.labels("empty").inc()
+        return None
+    return content.strip()
+
+
+async def _fix_batch(backend, indices, texts, slots, context_for):
+    """
+    Fix a batch of paragraphs (`indices` into `texts`) in one request, falling back to
+    one request per paragraph. `context_for(first, last)` returns the read-only context
+    for a run of paragraphs, or None. Paragraphs whose request failed come back as None.
+    """
+    if len(indices) == 1:
+        i = indices[0]
+        return [await _fix_paragraph(backend, i, texts[i], slots, context_for(i, i))]
+
+    batch_texts = [texts[i] for i in indices]
+    async with slots:
+        try:
+            prompt = build_batch_prompt(batch_texts)
+            # Leave room for the whole batch to come back, plus the markers.
+            max_tokens = max(MAX_TOKENS, 2 * estimate_tokens(prompt))
+            content, finish_reason = await _complete(
+                backend, _messages(prompt, context_for(indices[0], indices[-1])), max_tokens=max_tokens
+            )
+            improved = None
+            if finish_reason != "length":
+                improved = split_batch_response(content, len(batch_texts))
+        except Exception as e:
+            print(f"Model error on paragraphs {indices[0]}-{indices[-1]}:", e)
+            improved = None
+
+    if improved is not None:
+        return improved
+    print(f"Batch {indices[0]}-{indices[-1]} could not be split, fixing paragraphs one at a time.")
+    metrics.MODEL_FALLBACKS.labels("batch_split").inc()
+    return await asyncio.gather(*(
+        _fix_paragraph(backend, i, texts[i], slots, context_for(i, i)) for i in indices
+    ))
+
+
+async def fix_paragraphs(texts, concurrency=None, token_budget=None, on_progress=None, backend=None,
+                         flow=None, weight=1, failed=None, sections=None):
+    """
+    Fix a list of paragraph texts concurrently, at most `concurrency` requests at a time.
+    Results are returned in the same order as `texts`.
+
+    Paragraphs over SEGMENT_TOKEN_BUDGET are split into pieces (see `segment_paragraph`)
+    and joined again afterwards. Pieces are fixed in windows of FIX_WINDOW_SIZE: within
+    a window, pieces already in the cache are answered from it and the rest are packed
+    into batched requests (see `pack_paragraphs`), with CONTEXT_PARAGRAPHS neighbours
+    on each side as read-only context.
+
+    If given, `on_progress(done, total)` is called as paragraphs complete. `backend`
+    defaults to the one configured by MODEL_BACKEND (see model_backends). Requests
+    share the process-wide model capacity fairly as part of `flow` (e.g. a user id;
+    default: a flow of their own) with `weight` (see scheduler.py). If `failed` is a
+    set, the indices of paragraphs that kept (part of) their original text because a
+    model call failed are added to it. `sections[i]` may say which document text i
+    belongs to, when texts of several documents are fixed together; context is then
+    taken from the same document only.
+    """
+    backend = backend or get_backend()
+    flow = object() if flow is None else flow
+    slots = _RequestSlots(concurrency or FIX_CONCURRENCY, flow, weight)
+
+    # units[u] is a paragraph or a piece of one; owners[u] is the paragraph it belongs to.
+    units, separators, owners, unit_sections = [], [], [], []
+    for p, text in enumerate(texts):
+        for piece, separator in segment_paragraph(text):
+            units.append(piece)
+            separators.append(separator)
+            owners.append(p)
+            unit_sections.append(sections[p] if sections else None)
+    fixed_units = list(units)
+
+    total = len(texts)
+    done = 0
+    pieces_left = [0] * total
+    for p in owners:
+        pieces_left[p] += 1
+
+    def finish(finished):
+        nonlocal done
+        for u in finished:
+            pieces_left[owners[u]] -= 1
+            if pieces_left[owners[u]] == 0:
+                done += 1
+        if on_progress:
+            on_progress(done, total)
+
+    def context_for(first, last):
+        if not CONTEXT_PARAGRAPHS:
+            return None
+        chars = CONTEXT_TOKEN_BUDGET * 4
+        before = "\n\n".join(
+            units[u] for u in range(max(0, first - CONTEXT_PARAGRAPHS), first)
+            if unit_sections[u] == unit_sections[first]
+        )[-chars:]
+        after = "\n\n".join(
+            units[u] for u in range(last + 1, min(len(units), last + 1 + CONTEXT_PARAGRAPHS))
+            if unit_sections[u] == unit_sections[last]
+        )[:chars]
+        parts = [f"Before:\n{before}"] if before else []
+        if after:
+            parts.append(f"After:\n{after}")
+        return "\n\n".join(parts) or None
+
+    def cache_key(u):
+        # Corrections are cached per backend and model, and per context when it is sent.
+        context = context_for(u, u)
+        system = f"{SYSTEM_MSG}\n\n{context}" if context else SYSTEM_MSG
+        return make_cache_key(units[u], system, backend.cache_id, TEMPERATURE)
+
+    async def run_batch(batch, waiting, keys):
+        result = await _fix_batch(backend, batch, units, slots, context_for)
+        finish([w for u in batch for w in waiting[keys[u]]])
+        return result
+
+    finish([])
+    window = FIX_WINDOW_SIZE or len(units) or 1
+    for start in range(0, len(units), window):
+        keys = {u: cache_key(u) for u in range(start, min(start + window, len(units)))}
+        cached = await asyncio.to_thread(paragraph_cache.get_many, list(set(keys.values())))
+
+        # Only the first occurrence of each uncached piece goes to the model.
+        waiting = {}
+        for u, key in keys.items():
+            if key in cached:
+                fixed_units[u] = cached[key]
+            else:
+                waiting.setdefault(key, []).append(u)
+        hits = [u for u, key in keys.items() if key in cached]
+        metrics.CACHE_LOOKUPS.labels("paragraph", "hit").inc(len(hits))
+        metrics.CACHE_LOOKUPS.labels("paragraph", "miss").inc(len(keys) - len(hits))
+        finish(hits)
+
+        senders = [group[0] for group in waiting.values()]
+        batches = [[senders[i] for i in batch] for batch in pack_paragraphs([units[u] for u in senders], token_budget)]
+        fixed = await asyncio.gather(*(run_batch(batch, waiting, keys) for batch in batches))
+
+        new_entries = {}
+        for batch, results in zip(batches, fixed):
+            for u, improved in zip(batch, results):
+                if improved is not None:
+                    new_entries[keys[u]] = improved
+        if new_entries:
+            await asyncio.to_thread(paragraph_cache.put_many, new_entries)
+        # Fall back to the original text wherever the model call failed.
+        for key, group in waiting.items():
+            for u in group:
+                fixed_units[u] = new_entries.get(key, units[u])
+                if failed is not None and key not in new_entries:
+                    failed.add(owners[u])
+
+    # Join the pieces of each paragraph back together.
+    results = [""] * total
+    for u, piece in enumerate(fixed_units):
+        results[owners[u]] += piece + separators[u]
+    return results
+
+
+async def fix_docx_bytes(contents, on_progress=None, plan=None, flow=None, user_id=None):
+    """
+    Fix grammar, clarity & formatting in the bytes of a .docx file. Returns
+    (fixed document bytes, report), where report counts the paragraphs found,
+    skipped without a model call (by reason, see `paragraph_filter`), reused from
+    the user's previous version of the document and rewritten.
+    `on_progress(done, total)` reports paragraph progress.
+    The model backend is chosen by the user's `plan` (see model_backends), which also
+    weighs the document's share of model capacity against other `flow`s (default:
+    `user_id`). With a `user_id`, the document is diffed against and added to that
+    user's history (see document_history).
+    """
+    [outcome] = await fix_docx_batch([contents], on_progress, plan, flow, user_id)
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome
+
+
+async def fix_docx_batch(documents, on_progress=None, plan=None, flow=None, user_id=None):
+    """
+    Fix several .docx files (a list of bytes) together, as `fix_docx_bytes` does one:
+    the paragraphs of all of them go through one `fix_paragraphs` queue, so requests
+    are batched and de-duplicated across documents. Returns, for each document,
+    (fixed bytes, report) or the exception that stopped it; one document failing to
+    parse or save doesn't stop the others. Progress counts paragraphs over all documents.
+    """
+    backend = get_backend(plan)
+    # If the backend can't be set up we can't process the documents;
+    # this raises an error that the user's request will see.
+    backend.ensure_configured()
+
+    # 1) Parse the documents and collect the paragraphs that need the model (in the CPU pool)
+    async def parse(contents):
+        with metrics.stage("parse", bytes=len(contents)):
+            return await run_cpu(extract_paragraphs, contents)
+
+    outcomes = await asyncio.gather(*(parse(contents) for contents in documents), return_exceptions=True)
+    docs = []  # (index into documents, targets, skipped_by_reason, texts)
+    for n, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            print(f"Error parsing document {n}: {outcome}")
+            continue
+        total, targets, skipped_by_reason = outcome
+        print(f"Loaded {total} paragraphs, {sum(skipped_by_reason.values())} need no model call…")
+        docs.append((n, targets, skipped_by_reason, [text for _, text in targets]))
+
+    # 2) Reuse the corrections of paragraphs unchanged since the user's previous version.
+    use_history = user_id is not None and document_history.DOCUMENT_HISTORY
+    hashes = [[paragraph_hash(text) for text in texts] if use_history else [] for _, _, _, texts in docs]
+
+    async def lookup(texts, doc_hashes):
+        if not doc_hashes:
+            return {}
+        with metrics.stage("history_lookup", paragraphs=len(doc_hashes)):
+            reused = await asyncio.to_thread(document_history.find_reusable, user_id, texts, doc_hashes)
+        metrics.CACHE_LOOKUPS.labels("history", "hit").inc(len(reused))
+        metrics.CACHE_LOOKUPS.labels("history", "miss").inc(len(doc_hashes) - len(reused))
+        return reused
+
+    reused = await asyncio.gather(*(lookup(texts, h) for (_, _, _, texts), h in zip(docs, hashes)))
+
+    # 3) Fix the rest of every document in one queue; only this network-bound step runs
+    # on the event loop. Skipped and reused paragraphs count as done from the start.
+    pending = []  # (doc, paragraph) for every paragraph that goes to the model
+    for d, (_, _, _, texts) in enumerate(docs):
+        pending.extend((d, k) for k in range(len(texts)) if k not in reused[d])
+    done_upfront = sum(sum(skipped.values()) for _, _, skipped, _ in docs) + sum(map(len, reused))
+
+    def report_progress(done, count):
+        if on_progress:
+            on_progress(done + done_upfront, count + done_upfront)
+
+    failed = set()
+    with metrics.stage("model", paragraphs=len(pending), documents=len(docs), backend=backend.cache_id):
+        fixed_pending = await fix_paragraphs(
+            [docs[d][3][k] for d, k in pending], on_progress=report_progress, backend=backend,
+            flow=user_id if flow is None else flow, weight=plan_weight(plan), failed=failed,
+            sections=[d for d, _ in pending],
+        )
+    improved = [[reused[d].get(k, text) for k, text in enumerate(texts)] for d, (_, _, _, texts) in enumerate(docs)]
+    for (d, k), text in zip(pending, fixed_pending):
+        improved[d][k] = text
+
+    # Paragraphs the model failed on are left out of the history, so a re-upload tries them again.
+    failed = {pending[n] for n in failed}
+
+    async def record(d):
+        texts = docs[d][3]
+        kept = [k for k in range(len(texts)) if (d, k) not in failed]
+        with metrics.stage("history_save", paragraphs=len(kept)):
+            await asyncio.to_thread(
+                document_history.record, user_id, [hashes[d][k] for k in kept],
+                [texts[k] for k in kept], [improved[d][k] for k in kept],
+            )
+
+    await asyncio.gather(*(
+        record(d) for d in range(len(docs)) if hashes[d] and len(reused[d]) < len(hashes[d])
+    ))
+
+    # 4) Write results back and save (in the CPU pool), skipping paragraphs that came back unchanged
+    async def rewrite(d):
+        n, targets, skipped_by_reason, texts = docs[d]
+        corrections = {i: fixed for (i, text), fixed in zip(targets, improved[d]) if fixed != text}
+        fixed, changed, timings = await run_cpu(apply_corrections, documents[n], corrections)
+        metrics.record_stage("rewrite", timings["rewrite"], paragraphs=len(corrections))
+        metrics.record_stage("save", timings["save"], bytes=len(fixed))
+        print(f"Rewrote {changed} of {len(targets)} paragraphs ({len(reused[d])} reused from the previous version).")
+        skipped = sum(skipped_by_reason.values())
+        report = {
+            "paragraphs": len(targets) + skipped,
+            "skipped": skipped,
+            "skipped_by_reason": skipped_by_reason,
+            "reused": len(reused[d]),
+            "rewritten": changed,
+        }
+        return fixed, report
+
+    rewritten = await asyncio.gather(*(rewrite(d) for d in range(len(docs))), return_exceptions=True)
+    for (n, _, _, _), outcome in zip(docs, rewritten):
+        outcomes[n] = outcome
+    return outcomes
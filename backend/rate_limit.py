@@ -0,0 +1,101 @@
+# rate_limit.py
+"""
+Token-bucket rate limits for document uploads and authentication.
+
+Each bucket holds up to `burst` tokens and refills at `per_minute` tokens a
+minute; a request takes one token from every bucket it is checked against, or
+none if any of them is empty. A bulk upload takes one token per document: it
+needs a full bucket at most, and may leave it in debt, so the uploads after it
+wait until the whole batch has been paid for. Uploads are checked against the user's bucket
+(sized by plan) and the client IP's bucket, so neither many accounts behind one
+address nor one account from many addresses gets around the limits. Login and
+signup are checked against an IP bucket of their own.
+
+Buckets live in this process (like the "memory" auth cache backend), so with
+several API processes each enforces its own limits. Least recently used buckets
+are dropped past RATE_LIMIT_MAX_KEYS; a dropped bucket is simply full again.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# (per_minute, burst) for each kind of bucket.
+UPLOAD_LIMITS = {
+    "free": (float(os.getenv("RATE_LIMIT_FREE_PER_MINUTE", "2")), float(os.getenv("RATE_LIMIT_FREE_BURST", "3"))),
+    "pro": (float(os.getenv("RATE_LIMIT_PRO_PER_MINUTE", "10")), float(os.getenv("RATE_LIMIT_PRO_BURST", "10"))),
+}
+IP_UPLOAD_LIMIT = (float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "20")), float(os.getenv("RATE_LIMIT_IP_BURST", "20")))
+AUTH_LIMIT = (float(os.getenv("RATE_LIMIT_AUTH_PER_MINUTE", "20")), float(os.getenv("RATE_LIMIT_AUTH_BURST", "10")))
+
+
+class RateLimited(Exception):
+    """A bucket is empty; `retry_after` is the number of seconds until it has a token again."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limit exceeded; retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBuckets:
+    """Token buckets by key, bounded by `max_keys` (LRU). Thread-safe."""
+
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def _level(self, key, per_minute, burst, now):
+        tokens, updated = self._buckets.get(key, (burst, now))
+        return min(burst, tokens + (now - updated) * per_minute / 60)
+
+    def take(self, limits, now=None, count=1):
+        """
+        Take `count` tokens from each bucket in `limits`, a list of (key, per_minute, burst),
+        or from none of them. Raises RateLimited if any bucket has fewer than `count`
+        (or than `burst`, for a count larger than the bucket); it may go below zero.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            levels = [self._level(key, per_minute, burst, now) for key, per_minute, burst in limits]
+            needed = [min(count, burst) for _, _, burst in limits]
+            waits = [
+                (need - level) * 60 / per_minute if per_minute > 0 else float("inf")
+                for level, need, (_, per_minute, _) in zip(levels, needed, limits) if level < need
+            ]
+            if waits:
+                raise RateLimited(max(waits))
+            for level, (key, _, _) in zip(levels, limits):
+                self._buckets[key] = (level - count, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+buckets = TokenBuckets()
+
+
+def check_upload(user_id, plan, ip_address, count=1):
+    """Count `count` document uploads against the user's and the IP's buckets."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    per_minute, burst = UPLOAD_LIMITS.get(plan, UPLOAD_LIMITS["free"])
+    buckets.take([
+        (f"upload:user:{user_id}", per_minute, burst),
+        (f"upload:ip:{ip_address}", *IP_UPLOAD_LIMIT),
+    ], count=count)
+
+
+def check_auth(ip_address):
+    """Count one login or signup attempt against the IP's bucket."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    buckets.take([(f"auth:ip:{ip_address}", *AUTH_LIMIT)])
@@ -0,0 +1,109 @@
+# scheduler.py
+"""
+Fair sharing of model request capacity between users.
+
+Each document still limits itself to FIX_CONCURRENCY requests in flight, but
+every request also needs one of MODEL_CONCURRENCY slots shared by the whole
+process. When slots are scarce, waiting requests are grouped into flows (one
+per user) and a freed slot goes to the next flow by smooth weighted
+round-robin, with weights by plan (MODEL_WEIGHT_FREE / MODEL_WEIGHT_PRO). A
+user with fifty large uploads then gets one flow's share, not fifty, and a
+small free-tier document is served between their requests instead of after them.
+
+MODEL_CONCURRENCY=0 disables the shared limit.
+"""
+
+import os
+import asyncio
+from collections import deque
+
+MODEL_CONCURRENCY = int(os.getenv("MODEL_CONCURRENCY", "32"))
+PLAN_WEIGHTS = {
+    "free": int(os.getenv("MODEL_WEIGHT_FREE", "1")),
+    "pro": int(os.getenv("MODEL_WEIGHT_PRO", "3")),
+}
+
+
+def plan_weight(plan):
+    return PLAN_WEIGHTS.get(plan, PLAN_WEIGHTS["free"])
+
+
+class FairScheduler:
+    """
+    Hands out `capacity` slots. While any request is waiting, freed slots go to the
+    waiting flows in smooth weighted round-robin order (the nginx upstream algorithm),
+    and first come, first served within a flow. Not thread-safe: use from one event loop.
+    """
+
+    def __init__(self, capacity=MODEL_CONCURRENCY):
+        self.capacity = capacity
+        self.in_use = 0
+        self._waiting = {}  # flow -> deque of futures
+        self._weights = {}
+        self._credit = {}
+
+    async def acquire(self, flow, weight=1):
+        if self.capacity <= 0:
+            return
+        if self.in_use < self.capacity and not self._waiting:
+            self.in_use += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(flow, deque()).append(future)
+        self._weights[flow] = weight
+        self._credit.setdefault(flow, 0)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed to us just as we were cancelled; pass it on.
+                self.release()
+            else:
+                self._forget(flow, future)
+            raise
+
+    def release(self):
+        if self.capacity <= 0:
+            return
+        while self._waiting:
+            future = self._next_waiter()
+            if not future.done():
+                # The slot moves straight to the waiter, so in_use is unchanged.
+                future.set_result(None)
+                return
+        self.in_use -= 1
+
+    def _next_waiter(self):
+        total = 0
+        best = None
+        for flow in self._waiting:
+            self._credit[flow] += self._weights[flow]
+            total += self._weights[flow]
+            if best is None or self._credit[flow] > self._credit[best]:
+                best = flow
+        self._credit[best] -= total
+        future = self._waiting[best].popleft()
+        self._drop_if_idle(best)
+        return future
+
+    def _forget(self, flow, future):
+        queue = self._waiting.get(flow)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self._drop_if_idle(flow)
+
+    def _drop_if_idle(self, flow):
+        if not self._waiting[flow]:
+            # An idle flow doesn't bank credit for later.
+            del self._waiting[flow], self._weights[flow], self._credit[flow]
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "waiting": sum(len(queue) for queue in self._waiting.values()),
+            "flows_waiting": len(self._waiting),
+        }
+
+
+model_scheduler = FairScheduler()
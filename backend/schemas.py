@@ -26,6 +26,26 @@ class User(UserBase):
     class Config:
         from_attributes = True # Changed from orm_mode for Pydantic v2
 
+# --- Job Schemas ---
+class JobCreated(BaseModel):
+    job_id: str
+    status: str
+
+class JobStatus(BaseModel):
+    id: str
+    file_name: str
+    status: str
+    paragraphs_done: int
+    paragraphs_total: int
+    paragraphs_skipped: int = 0
+    paragraphs_reused: int = 0
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # --- Stripe Schemas ---
 class CheckoutSessionRequest(BaseModel):
     priceId: str
\ No newline at end of file
@@ -0,0 +1,83 @@
+# usage.py
+"""
+Per-user, per-billing-period document counters.
+
+Paid plans have one `usage_counters` row per calendar month (UTC); the free plan
+is a lifetime allowance, counted in a single row whose period is LIFETIME. A
+document reserves its slot before it is processed with a single conditional
+UPDATE (`count < limit`), so concurrent uploads cannot push a user past their
+plan limit. If processing fails the slot is given back with `release`, in the
+period it was reserved in.
+
+`processed_files` stays the per-document history; it is no longer counted
+for quota checks.
+"""
+
+from datetime import date, datetime, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+import models
+
+
+# Period of the free plan's counter: its documents are counted over the user's lifetime.
+LIFETIME = date(1970, 1, 1)
+
+
+def period_start(when=None, plan=None):
+    """First day of `plan`'s billing period containing `when` (default: now); LIFETIME for the free plan."""
+    if plan == "free":
+        return LIFETIME
+    when = when or datetime.now(timezone.utc)
+    return date(when.year, when.month, 1)
+
+
+def _counter(db, user_id, period):
+    return db.query(models.UsageCounter).filter(
+        models.UsageCounter.user_id == user_id,
+        models.UsageCounter.period_start == period,
+    )
+
+
+def reserve(db, user_id, limit=None, count=1, plan=None):
+    """
+    Count `count` documents against the user's current period for `plan` if that keeps
+    them within `limit` (None: no limit). Returns the period the slots were reserved in,
+    to hand to `release`, or None if they don't fit.
+    """
+    period = period_start(plan=plan)
+    for _ in range(3):
+        counter = _counter(db, user_id, period)
+        if limit is not None:
+            counter = counter.filter(models.UsageCounter.count <= limit - count)
+        reserved = counter.update({models.UsageCounter.count: models.UsageCounter.count + count}, synchronize_session=False)
+        if reserved:
+            db.commit()
+            return period
+        db.rollback()
+        row = _counter(db, user_id, period).first()
+        if row is not None:
+            if limit is not None and row.count + count > limit:
+                return None
+            # A concurrent request created the row after our UPDATE ran; try again.
+            continue
+        # First document this period: create the row, then retry the increment.
+        try:
+            db.execute(insert(models.UsageCounter).values(user_id=user_id, period_start=period, count=0))
+            db.commit()
+        except IntegrityError:
+            # A concurrent request created it first.
+            db.rollback()
+    return None
+
+
+def release(db, user_id, period=None, count=1):
+    """
+    Give back `count` slots taken by `reserve` (in `period`, default: this month) for
+    documents that were not delivered. Commits, together with anything else pending in `db`.
+    """
+    _counter(db, user_id, period or period_start()).filter(
+        models.UsageCounter.count >= count
+    ).update({models.UsageCounter.count: models.UsageCounter.count - count}, synchronize_session=False)
+    db.commit()
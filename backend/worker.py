@@ -0,0 +1,126 @@
+# worker.py
+"""
+Background worker for queued document fixes.
+
+Runs as its own set of local processes, separately from the API server, so the
+two can be scaled independently:
+
+    python worker.py --processes 4
+
+Each process polls the `jobs` table, claims one job at a time, and runs the
+same fixing pipeline as `/fix-document/`, reporting paragraph progress as it goes.
+"""
+
+import os
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import time
+
+from database import SessionLocal
+import jobs
+from auth_cache import auth_cache
+from process_docx import fix_docx_bytes, shutdown_doc_pool
+import metrics
+
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# Progress is written to the database at most this often (seconds) per job.
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "1.0"))
+
+
+async def process_job(db, job):
+    """Run one claimed job to completion, storing either the result or the error."""
+    print(f"[worker {os.getpid()}] Processing job {job.id} ({job.file_name})")
+    # Stage spans of this job are logged under its id.
+    metrics.request_id.set(job.id)
+    last_write = 0.0
+
+    def on_progress(done, total):
+        nonlocal last_write
+        now = time.monotonic()
+        if done == total or now - last_write >= JOB_PROGRESS_INTERVAL:
+            last_write = now
+            jobs.update_progress(db, job.id, done, total)
+
+    try:
+        result, report = await fix_docx_bytes(
+            job.input_data, on_progress=on_progress, plan=job.owner.plan, user_id=job.user_id
+        )
+    except Exception as e:
+        print(f"[worker {os.getpid()}] Job {job.id} failed: {e}")
+        db.rollback()
+        jobs.fail_job(db, job, e)
+        # Only reaches the API processes when AUTH_CACHE_BACKEND is shared (redis).
+        await auth_cache.invalidate(job.owner.email)
+        return
+    with metrics.stage("store"):
+        jobs.complete_job(db, job, result, report["skipped"], report["reused"])
+    print(f"[worker {os.getpid()}] Job {job.id} done")
+
+
+async def run_worker(stop):
+    """Poll for jobs until `stop` is set."""
+    while not stop.is_set():
+        db = SessionLocal()
+        try:
+            jobs.maybe_purge_finished_jobs(db)
+            job = jobs.claim_next_job(db)
+            if job is not None:
+                await process_job(db, job)
+                continue
+        except Exception as e:
+            print(f"[worker {os.getpid()}] Error while polling for jobs: {e}")
+        finally:
+            db.close()
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+def _worker_main():
+    stop = asyncio.Event()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            # Finish the current job, then exit.
+            loop.add_signal_handler(sig, stop.set)
+        await run_worker(stop)
+
+    try:
+        asyncio.run(main())
+    finally:
+        shutdown_doc_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run SmartDocFixer background workers.")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("WORKER_PROCESSES", "2")),
+                        help="Number of worker processes to start")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _worker_main()
+        return
+
+    processes = [multiprocessing.Process(target=_worker_main, name=f"worker-{i}") for i in range(args.processes)]
+    for p in processes:
+        p.start()
+    print(f"Started {len(processes)} worker processes.")
+
+    def forward_sigterm(signum, frame):
+        # Let every child finish its current job before exiting.
+        for p in processes:
+            p.terminate()
+
+    signal.signal(signal.SIGTERM, forward_sigterm)
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        # Children received the same SIGINT and are finishing their current job.
+        for p in processes:
+            p.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -131,7 +131,7 @@ document.addEventListener('DOMContentLoaded', () => {
             formData.append('file', currentFile);
     
             try {
-                const response = await fetch(`${API_URL}/fix-document/`, {
+                const response = await fetch(`${API_URL}/fix-document/stream`, {
                     method: 'POST',
                     headers: {
                         'Authorization': `Bearer ${token}`
@@ -140,26 +140,41 @@ document.addEventListener('DOMContentLoaded', () => {
                 });
     
                 if (response.ok) {
-                    const blob = await response.blob();
-                    const url = window.URL.createObjectURL(blob);
-                    const a = document.createElement('a');
-                    a.style.display = 'none';
-                    a.href = url;
-                    // The backend suggests a filename, but we can construct one too
-                    const contentDisposition = response.headers.get('content-disposition');
-                    let filename = `SmartDocFixed_${currentFile.name}`;
-                    if (contentDisposition) {
-                        const filenameMatch = contentDisposition.match(/filename="(.+)"/);
-                        if (filenameMatch.length > 1) {
-                            filename = filenameMatch[1];
+                    // The server streams Server-Sent Events: "progress" while paragraphs
+                    // are being fixed, then "done" with a download link (or "error").
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = '';
+                    let result = null;
+                    while (!result) {
+                        const { value, done } = await reader.read();
+                        if (done) break;
+                        buffer += decoder.decode(value, { stream: true });
+                        const events = buffer.split('\n\n');
+                        buffer = events.pop();
+                        for (const raw of events) {
+                            const event = (raw.match(/^event: (.*)$/m) || [])[1];
+                            const data = JSON.parse((raw.match(/^data: (.*)$/m) || [])[1] || '{}');
+                            if (event === 'progress' && data.total) {
+                                showMessage('home', `Fixing paragraphs... ${data.done} of ${data.total}`, 'info');
+                            } else if (event === 'done' || event === 'error') {
+                                result = { event, data };
+                            }
                         }
                     }
-                    a.download = filename;
-                    document.body.appendChild(a);
-                    a.click();
-                    window.URL.revokeObjectURL(url);
-                    a.remove();
-                    showMessage('home', 'Your document has been downloaded!', 'success');
+
+                    if (result && result.event === 'done') {
+                        const a = document.createElement('a');
+                        a.style.display = 'none';
+                        a.href = `${API_URL}${result.data.download_url}`;
+                        a.download = `SmartDocFixed_${currentFile.name}`;
+                        document.body.appendChild(a);
+                        a.click();
+                        a.remove();
+                        showMessage('home', 'Your document has been downloaded!', 'success');
+                    } else {
+                        showMessage('home', (result && result.data.detail) || 'An error occurred.', 'error');
+                    }
                 } else {
                     const errorData = await response.json();
                     if (response.status === 402) { // Payment Required